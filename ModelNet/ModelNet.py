@@ -4,8 +4,15 @@ import time
 import argparse
 import importlib
 import os
+import shutil
+import logging
+# The number of points of each batch changes, so the caching allocator uses
+# expandable segments to reduce fragmentation. It has to be set before torch
+# initializes CUDA, and it can be overridden from the environment.
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True')
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 from torch.utils.data import DataLoader
 import numpy as np
@@ -16,48 +23,180 @@ sys.path.append(os.path.join(ROOT_DIR, 'models'))
 sys.path.append(os.path.join(ROOT_DIR, 'utils'))
 
 from models.MCClassS import MCClassS
+from utils.MCConvBuilder import ConvolutionBuilder
 from utils.PyUtils import visualize_progress
 from ModelNetDataSet import ModelNetDataSet
-
-current_milli_time = lambda: time.time() * 1000.0
+from ModelNetTorchDataSet import ModelNetTorchDataSet
 
 
 def create_loss(logits, labels):
-    criterion = nn.CrossEntropyLoss()
-    xentropy_loss = criterion(logits, labels)
-    return xentropy_loss
+    """Method to compute the classification loss of a batch.
+
+    The loss does not contain a L2 regularization term: the weight decay is applied
+    by the optimizer, and only when it is different from 0.
+
+    Args:
+        logits (bxc tensor): Logits of each model of the batch.
+        labels (b tensor): Category of each model of the batch.
+
+    Returns:
+        xentropy_loss (tensor): Mean cross entropy of the batch.
+    """
+    return F.cross_entropy(logits, labels)
+
+
+def forward_step(model, points, batchIds, features, labels, amp_dtype):
+    """Method to compute the logits and the loss of a batch.
+
+    Args:
+        model (nn.Module): Classification model.
+        points (nx3 tensor): List of points of the batch.
+        batchIds (n tensor): List of model indentifiers within the batch for each point.
+        features (nxm tensor): List of point features.
+        labels (b tensor): Category of each model of the batch.
+        amp_dtype (torch.dtype): Data type used in autocast regions, or None to
+            use full precision.
+
+    Returns:
+        logits (bxc tensor): Logits of each model of the batch.
+        xentropy_loss (tensor): Mean cross entropy of the batch.
+    """
+    with torch.autocast(device_type=points.device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+        logits = model(points, batchIds, features)
+        xentropy_loss = create_loss(logits, labels)
+    return logits, xentropy_loss
+
+
+def rotation_matrices(angles, axis):
+    """Method to compute a batch of rotation matrices along an axis.
+
+    Args:
+        angles (b tensor): Rotation angles.
+        axis (int): Rotation axis. Allowed values (0, 1, 2).
+
+    Returns:
+        rotationMatrices (bx3x3 tensor): Rotation matrices.
+    """
+    cosval = torch.cos(angles)
+    sinval = torch.sin(angles)
+    ones = torch.ones_like(angles)
+    zeros = torch.zeros_like(angles)
+    if axis == 0:
+        rows = [ones, zeros, zeros, zeros, cosval, -sinval, zeros, sinval, cosval]
+    elif axis == 1:
+        rows = [cosval, zeros, sinval, zeros, ones, zeros, -sinval, zeros, cosval]
+    else:
+        rows = [cosval, -sinval, zeros, sinval, cosval, zeros, zeros, zeros, ones]
+    return torch.stack(rows, dim=1).view(-1, 3, 3)
+
+
+def augment_on_device(points, batchIds, batchSize, mainRotAxis=1, smallRotations=True):
+    """Method to augment a batch of point clouds on the device. It follows the same
+    protocol as DataSet._augment_data_rot_: a random rotation along the main axis
+    followed by small rotations along all the 3 axes, one per model in the batch.
+
+    Args:
+        points (nx3 tensor): List of points of the batch.
+        batchIds (n or nx1 tensor): List of model indentifiers within the batch for each point.
+        batchSize (int): Size of the batch.
+        mainRotAxis (int): Rotation axis. Allowed values (0, 1, 2).
+        smallRotations (bool): Boolean that indicates if small rotations alogn all the
+            3 axes will be also applied.
+
+    Returns:
+        augPoints (nx3 tensor): List of transformed points.
+    """
+    rotationAngles = torch.rand(batchSize, device=points.device) * (2.0 * math.pi)
+    rotationMatrices = rotation_matrices(rotationAngles, mainRotAxis)
+    if smallRotations:
+        angles = torch.clamp(0.06 * torch.randn(batchSize, 3, device=points.device), -0.18, 0.18)
+        R = torch.bmm(rotation_matrices(angles[:, 2], 2),
+            torch.bmm(rotation_matrices(angles[:, 1], 1), rotation_matrices(angles[:, 0], 0)))
+        rotationMatrices = torch.bmm(R, rotationMatrices)
+    ptRotationMatrices = rotationMatrices[batchIds.view(-1).long()]
+    return torch.einsum('nc,ncd->nd', points, ptRotationMatrices)
 
 
 def create_accuracy(logits, labels):
-    # Get the indices of the top values in logits along the last dimension
-    _, logits_indices = torch.topk(logits, 1, dim=-1)
-    
-    # Reshape labels to have the same shape as logits_indices
-    labels = labels.view(-1, 1)
-    
-    # Calculate accuracy
-    correct_predictions = (logits_indices == labels).float()
-    accuracy = correct_predictions.mean().item()  # Mean of correct predictions
-
-    return accuracy
-
-def load_weights(model, optimizer, lr_scheduler):
+    """Method to count the correct predictions of a batch.
+
+    Args:
+        logits (bxc tensor): Logits of each model of the batch.
+        labels (b tensor): Category of each model of the batch.
+
+    Returns:
+        correct (int64 tensor): Number of correct predictions, on the device of logits.
+        total (int): Number of predictions.
+    """
+    correct = logits.argmax(dim=1).eq(labels).sum()
+    return correct, labels.numel()
+
+def pack_optimizer_state(model, optimizerState):
+    """Method to convert an optimizer state saved before the weights and biases of the
+    convolutions were packed into a single parameter.
+
+    The old state has one entry per weight and bias tensor, in the order of
+    ConvolutionBuilder.PARAM_NAMES. The entries of each convolution are concatenated
+    into the entry of its packedParams.
+
+    Args:
+        model (nn.Module): Model with packed convolution parameters.
+        optimizerState (dict): Optimizer state dictionary of the checkpoint.
+
+    Returns:
+        optimizerState (dict): Optimizer state dictionary matching the parameters of the
+            model, or None if the state could not be converted.
+    """
+    # Number of old parameters that correspond to each parameter of the model.
+    numOldParams = [len(ConvolutionBuilder.PARAM_NAMES) if name.endswith('packedParams') else 1
+        for name, _ in model.named_parameters()]
+    oldIds = [paramId for group in optimizerState['param_groups'] for paramId in group['params']]
+    if len(oldIds) == len(numOldParams):
+        return optimizerState
+    if len(oldIds) != sum(numOldParams):
+        return None
+
+    newState = {}
+    newGroups = []
+    oldIter = iter(oldIds)
+    newIter = iter(enumerate(numOldParams))
+    for group in optimizerState['param_groups']:
+        newGroup = dict(group, params=[])
+        numGroupParams = len(group['params'])
+        while numGroupParams > 0:
+            newId, numParams = next(newIter)
+            paramIds = [next(oldIter) for _ in range(numParams)]
+            numGroupParams -= numParams
+            newGroup['params'].append(newId)
+            states = [optimizerState['state'][paramId] for paramId in paramIds
+                if paramId in optimizerState['state']]
+            if len(states) == numParams:
+                # The moments are concatenated and the scalar entries, such as the
+                # step, are shared by all the tensors of the convolution.
+                newState[newId] = {key: torch.cat([state[key].reshape(-1) for state in states])
+                    if torch.is_tensor(value) and value.dim() > 0 else value
+                    for key, value in states[0].items()}
+        if numGroupParams < 0:
+            return None
+        newGroups.append(newGroup)
+    return {'state': newState, 'param_groups': newGroups}
+
+def load_weights(model, optimizer, lr_scheduler, steps_per_epoch):
     checkpoint = torch.load('checkpoint.pth')
     model.load_state_dict(checkpoint['model_state_dict'])
-    optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+    optimizerState = pack_optimizer_state(model, checkpoint['optimizer_state_dict'])
+    if optimizerState is None:
+        print('The optimizer state of the checkpoint does not match the model, it is not loaded.')
+    else:
+        optimizer.load_state_dict(optimizerState)
     epoch = checkpoint['epoch']
-    for (name, initial_param), (name_after, loaded_param) in zip(initial_params.items(), model.named_parameters()):
-        if not torch.equal(initial_param, loaded_param):
-            print(f"Parameter '{name}' has been modified after loading checkpoint.")
-        else:
-            print(f"Parameter '{name}' matches after loading checkpoint.")
-        
-        print("Checkpoint loading test complete.")
 
-    if 'scheduler_state_dict' not in checkpoint:
-        num_steps = epoch // args.learningDecayRate
-        for _ in range(num_steps):
-            lr_scheduler.step()
+    # Checkpoints saved with the per epoch scheduler do not store the number of
+    # batches processed, so the per batch scheduler is moved to the start epoch.
+    # The schedule is a closed form of the step, so a single step is enough.
+    if 'lr_lambdas' not in checkpoint.get('scheduler_state_dict', {}):
+        lr_scheduler.last_epoch = epoch * steps_per_epoch - 1
+        lr_scheduler.step()
     else:
         lr_scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
     return model, optimizer, lr_scheduler, epoch
@@ -117,18 +256,6 @@ def git_commit_and_push():
     except subprocess.CalledProcessError as e:
         print(f"Error during git commit/push: {e}")
 
-def get_weights(model):
-    return {name: param.data.clone() for name, param in model.named_parameters()}
-
-# Check which layers have changed weights
-def check_weights_changed(model, initial_weights):
-    changes = []
-    for name, param in model.named_parameters():
-        if torch.equal(param.data, initial_weights[name]):
-            changes.append(name)
-    
-    return changes
-
 model_map = {
     'MCClassS' : MCClassS
 }
@@ -138,7 +265,7 @@ if __name__ == '__main__':
     parser.add_argument('--logFolder', default='log', help='Folder of the output models (default: log)')
     parser.add_argument('--model', default='MCClassS', help='model (default: MCClassS)')
     parser.add_argument('--grow', default=64, type=int, help='Grow rate (default: 64)')
-    parser.add_argument('--batchSize', default=32, type=int, help='Batch size  (default: 32)')
+    parser.add_argument('--batchSize', '--batch_size', dest='batchSize', default=32, type=int, help='Batch size  (default: 32)')
     parser.add_argument('--maxEpoch', default=201, type=int, help='Max Epoch  (default: 201)')
     parser.add_argument('--initLearningRate', default=0.005, type=float, help='Init learning rate  (default: 0.005)')
     parser.add_argument('--learningDecayFactor', default=0.5, type=float, help='Learning decay factor (default: 0.5)')
@@ -154,34 +281,38 @@ if __name__ == '__main__':
     parser.add_argument('--augment', action='store_true', help='Augment data (default: False)')
     parser.add_argument('--nonunif', action='store_true', help='Train on non-uniform (default: False)')
     parser.add_argument('--gpu', default='0', help='GPU (default: 0)')
-    parser.add_argument('--gpuMem', default=0.5, type=float, help='GPU memory used (default: 0.5)')
+    parser.add_argument('--gpuMem', default=0.5, type=float, help='GPU memory used, not used by the PyTorch version, which relies on the caching allocator with PYTORCH_CUDA_ALLOC_CONF=expandable_segments:True unless set in the environment (default: 0.5)')
+    parser.add_argument('--nWorkers', default=min(8, os.cpu_count()), type=int, help='Number of data loading workers (default: min(8, cpu count))')
     parser.add_argument('--use_pretrain', default=False, action='store_true', help='whether to use pretrain weights')
     parser.add_argument('--use_pdf', default=True, action='store_false', help='whether to use pdf')
+    parser.add_argument('--compile', action='store_true', help='Compile the model with torch.compile (default: False)')
+    parser.add_argument('--precision', default='fp32', choices=['fp32', 'bf16', 'fp16'], help='Precision used in the forward pass (default: fp32)')
     args = parser.parse_args()
 
     if not os.path.exists(args.logFolder): os.mkdir(args.logFolder)
-    os.system('cp ../models/%s.py %s' % (args.model, args.logFolder))
-    os.system('cp ModelNet.py %s' % (args.logFolder))
+    shutil.copy('../models/%s.py' % args.model, args.logFolder)
+    shutil.copy('ModelNet.py', args.logFolder)
     logFile = args.logFolder + "/log.txt"
-
-    with open(logFile, "a") as myFile:
-        myFile.write(f"Model: {args.model}\n")
-        myFile.write(f"Grow: {args.grow}\n")
-        myFile.write(f"BatchSize: {args.batchSize}\n")
-        myFile.write(f"MaxEpoch: {args.maxEpoch}\n")
-        myFile.write(f"InitLearningRate: {args.initLearningRate}\n")
-        myFile.write(f"LearningDecayFactor: {args.learningDecayFactor}\n")
-        myFile.write(f"LearningDecayRate: {args.learningDecayRate}\n")
-        myFile.write(f"MaxLearningRate: {args.maxLearningRate}\n")
-        myFile.write(f"UseDropOut: {args.useDropOut}\n")
-        myFile.write(f"DropOutKeepProb: {args.dropOutKeepProb}\n")
-        myFile.write(f"UseDropOutConv: {args.useDropOutConv}\n")
-        myFile.write(f"DropOutKeepProbConv: {args.dropOutKeepProbConv}\n")
-        myFile.write(f"WeightDecay: {args.weightDecay}\n")
-        myFile.write(f"nPoints: {args.nPoints}\n")
-        myFile.write(f"ptDropOut: {args.ptDropOut}\n")
-        myFile.write(f"Augment: {args.augment}\n")
-        myFile.write(f"Nonunif: {args.nonunif}\n")
+    logging.basicConfig(filename=logFile, level=logging.INFO, format='%(message)s')
+
+    logging.info(f"Model: {args.model}")
+    logging.info(f"Grow: {args.grow}")
+    logging.info(f"BatchSize: {args.batchSize}")
+    logging.info(f"MaxEpoch: {args.maxEpoch}")
+    logging.info(f"InitLearningRate: {args.initLearningRate}")
+    logging.info(f"LearningDecayFactor: {args.learningDecayFactor}")
+    logging.info(f"LearningDecayRate: {args.learningDecayRate}")
+    logging.info(f"MaxLearningRate: {args.maxLearningRate}")
+    logging.info(f"UseDropOut: {args.useDropOut}")
+    logging.info(f"DropOutKeepProb: {args.dropOutKeepProb}")
+    logging.info(f"UseDropOutConv: {args.useDropOutConv}")
+    logging.info(f"DropOutKeepProbConv: {args.dropOutKeepProbConv}")
+    logging.info(f"WeightDecay: {args.weightDecay}")
+    logging.info(f"nPoints: {args.nPoints}")
+    logging.info(f"ptDropOut: {args.ptDropOut}")
+    logging.info(f"Augment: {args.augment}")
+    logging.info(f"Nonunif: {args.nonunif}")
+    logging.info(f"Precision: {args.precision}")
 
     print(f"Model: {args.model}")
     print(f"Grow: {args.grow}")
@@ -201,6 +332,8 @@ if __name__ == '__main__':
     print(f"Augment: {args.augment}")
     print(f"Nonunif: {args.nonunif}")
     print(f"use pdf: {args.use_pdf}")
+    print(f"Precision: {args.precision}")
+    print(f"Compile: {args.compile}")
 
     # Get train and test datasets
     allowedSamplingsTrain = []
@@ -214,9 +347,14 @@ if __name__ == '__main__':
         allowedSamplingsTrain = [0]
         allowedSamplingsTest = [0]
     print('start loading dataset')
-    mTrainDataSet = ModelNetDataSet(True, args.nPoints, args.ptDropOut, maxStoredPoints, args.batchSize, allowedSamplingsTrain, args.augment)
+    # The training models are augmented on the device (see augment_on_device).
+    mTrainDataSet = ModelNetDataSet(True, args.nPoints, args.ptDropOut, maxStoredPoints, args.batchSize, allowedSamplingsTrain, False)
     mTestDataSet = ModelNetDataSet(False, args.nPoints, 1.0, maxStoredPoints, args.batchSize, allowedSamplingsTest, False)
     categories = mTrainDataSet.get_categories()
+    mTrainLoader = DataLoader(ModelNetTorchDataSet(mTrainDataSet), batch_size=None, num_workers=args.nWorkers,
+        pin_memory=True, persistent_workers=args.nWorkers > 0, prefetch_factor=4 if args.nWorkers > 0 else None)
+    mTestLoader = DataLoader(ModelNetTorchDataSet(mTestDataSet), batch_size=None, num_workers=args.nWorkers,
+        pin_memory=True, persistent_workers=args.nWorkers > 0, prefetch_factor=4 if args.nWorkers > 0 else None)
     print('finish loading dataset')
     
     #Create the network
@@ -227,64 +365,103 @@ if __name__ == '__main__':
 
     # Load the model
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    # Use TF32 in the fp32 matrix multiplications of the MLPs. The cudnn autotuner
+    # is not enabled: the model has no convolution layers and the number of points
+    # of each level of the hierarchy changes from batch to batch.
+    torch.set_float32_matmul_precision('high')
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
     model_class = model_map[args.model]
     model = model_class(numInputFeatures=num_input_features, k=k, numOutCat=num_out_cat, 
                                   batch_size=batch_size, keepProbConv=args.dropOutKeepProbConv, keepProbFull=args.dropOutKeepProb, 
                                   useConvDropOut=args.useDropOutConv, useDropOutFull=args.useDropOut, use_pdf=args.use_pdf).to(device)
-
-    # TODO add learning rate decay per batch
-    optimizer = optim.Adam(model.parameters(), lr=args.initLearningRate, weight_decay=args.weightDecay)
-    lr_scheduler = optim.lr_scheduler.ExponentialLR(optimizer, gamma=args.learningDecayFactor)
-    for param_group in optimizer.param_groups:
-        param_group['lr'] = max(param_group['lr'], args.maxLearningRate)
+    # The forward pass and the loss are compiled together, while the backward pass
+    # and the optimizer step, which go through the gradient scaler, stay in eager
+    # mode. With uniform sampling the number of input points is constant, so the
+    # step is specialized to static shapes and a shape change recompiles it.
+    # fullgraph is not requested: the point hierarchy reads the number of sampled
+    # points and neighbors back to the host, produces data-dependent sizes, and
+    # runs on a side stream synchronized with an event, so the graph is broken there.
+    step_fn = forward_step
+    if args.compile:
+        step_fn = torch.compile(forward_step, mode='reduce-overhead', dynamic=None if args.nonunif else False)
+
+    # Decoupled weight decay is applied inside the fused optimizer step, so the
+    # loss does not need an explicit L2 term over all the parameters. Without
+    # weight decay, plain Adam avoids the decay bookkeeping altogether.
+    if args.weightDecay == 0.0:
+        optimizer = optim.Adam(model.parameters(), lr=args.initLearningRate)
+    else:
+        optimizer = optim.AdamW(model.parameters(), lr=args.initLearningRate, weight_decay=args.weightDecay)
+    # The learning rate is decayed by learningDecayFactor every learningDecayRate
+    # epochs, down to maxLearningRate. As in the tensorflow version, the schedule
+    # is defined in batches and the scheduler is updated after each optimizer step.
+    decay_steps = args.learningDecayRate * len(mTrainLoader)
+    min_lr_factor = args.maxLearningRate / args.initLearningRate
+    lr_scheduler = optim.lr_scheduler.LambdaLR(optimizer,
+        lambda step: max(args.learningDecayFactor ** (step // decay_steps), min_lr_factor))
+
+    # Mixed precision. The gradient scaler is only needed for fp16, for the other
+    # precisions it is disabled and behaves as a pass-through.
+    amp_dtype = {'bf16': torch.bfloat16, 'fp16': torch.float16}.get(args.precision)
+    scaler = torch.amp.GradScaler(device.type, enabled=args.precision == 'fp16')
 
     start_epoch = 0
     if args.use_pretrain:
         print('use pretrained weights....')
-        # Save the model's initial parameters
-        initial_params = {name: param.clone() for name, param in model.named_parameters()}
-        model, optimizer, lr_scheduler, start_epoch = load_weights(model, optimizer, lr_scheduler)
+        model, optimizer, lr_scheduler, start_epoch = load_weights(model, optimizer, lr_scheduler, len(mTrainLoader))
 
 
     # Train model
     bestTestAccuracy = -1.0
     print("start training...")
     for epoch in range(start_epoch, args.maxEpoch):
-        startEpochTime = current_milli_time()
-        startTrainTime = current_milli_time()
+        # Time the epoch with CUDA events, which measure the work on the device
+        # without synchronizing the host after each kernel launch.
+        startEpochEvent = torch.cuda.Event(enable_timing=True)
+        endEpochEvent = torch.cuda.Event(enable_timing=True)
+        startEpochEvent.record()
 
         model.train()
-        running_loss = 0.0
-        total_accuracy = 0.0
-        mTrainDataSet.start_iteration()
+        # The loss is accumulated on the device to avoid a synchronization per step.
+        running_loss = torch.zeros((), device=device)
+        epoch_correct = torch.zeros((), dtype=torch.long, device=device)
+        epoch_total = 0
         num_iter = 0
-        while mTrainDataSet.has_more_batches():
-            initial_weights = get_weights(model)
-            _, points, batchIds, features, _, labels, _ = mTrainDataSet.get_next_batch()
-            points = torch.from_numpy(points).float().cuda()
-            batchIds = torch.from_numpy(batchIds).int().cuda()
-            features = torch.from_numpy(features).float().cuda()
-            labels = torch.from_numpy(labels).long().cuda()
-            logits = model(points, batchIds, features)
-            xentropy_loss = create_loss(logits, labels)
-            running_loss += xentropy_loss.item()
-            optimizer.zero_grad()
-            xentropy_loss.backward()
-            optimizer.step()
-
-            not_changed_layers = check_weights_changed(model, initial_weights)
-            if len(not_changed_layers) > 0:
-                print(not_changed_layers)
-            accuracy = create_accuracy(logits, labels)
-            total_accuracy += accuracy
+        for _, points, batchIds, features, _, labels, _ in mTrainLoader:
+            points = points.to(device, non_blocking=True)
+            batchIds = batchIds.to(device, non_blocking=True)
+            features = features.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            if args.augment:
+                points = augment_on_device(points, batchIds, args.batchSize)
+            logits, xentropy_loss = step_fn(model, points, batchIds, features, labels, amp_dtype)
+            running_loss += xentropy_loss.detach()
+            optimizer.zero_grad(set_to_none=True)
+            scaler.scale(xentropy_loss).backward()
+            scaler.step(optimizer)
+            # The scaler skips the optimizer step and reduces the scale when the
+            # gradients are not finite, in which case the schedule does not advance.
+            prevScale = scaler.get_scale()
+            scaler.update()
+            if scaler.get_scale() >= prevScale:
+                lr_scheduler.step()
+
+            correct, total = create_accuracy(logits, labels)
+            epoch_correct += correct
+            epoch_total += total
             if num_iter % 50 == 0:
-                print(f"B [{num_iter}], Loss: {xentropy_loss.item():.4f}, Accuracy: {accuracy:.4f}")
+                # Read both metrics with a single device to host copy.
+                loss_value, correct_value = torch.stack([xentropy_loss.detach().float(), correct.float()]).tolist()
+                print(f"B [{num_iter}], Loss: {loss_value:.4f}, Accuracy: {correct_value / total:.4f}")
             num_iter += 1
         
-        endEpochTime = current_milli_time()   
-        running_loss /= num_iter
-        total_accuracy /= num_iter
-        print(f"Epoch [{epoch + 1}/{args.maxEpoch}], Loss: {running_loss:.4f}, Accuracy: {total_accuracy:.4f}, Training time: {((endEpochTime-startEpochTime)/1000.0):.2f}")
+        endEpochEvent.record()
+        endEpochEvent.synchronize()
+        epochTime = startEpochEvent.elapsed_time(endEpochEvent)
+        running_loss = (running_loss / num_iter).item()
+        total_accuracy = epoch_correct.item() / epoch_total
+        print(f"Epoch [{epoch + 1}/{args.maxEpoch}], Loss: {running_loss:.4f}, Accuracy: {total_accuracy:.4f}, Training time: {(epochTime/1000.0):.2f}")
         
         # Check on test data for early stopping
         if (epoch) % 10 == 0:
@@ -294,29 +471,29 @@ if __name__ == '__main__':
             #     if isinstance(module, nn.BatchNorm1d):
             #         module.train()
                     
-            test_loss = 0.0
-            test_accuracy = 0.0
-            mTestDataSet.start_iteration()
+            test_loss = torch.zeros((), device=device)
+            test_correct = torch.zeros((), dtype=torch.long, device=device)
+            test_total = 0
             num_iter = 0
             with torch.no_grad():
-                while mTestDataSet.has_more_batches():
+                for _, points, batchIds, features, _, labels, _ in mTestLoader:
                     num_iter += 1
-                    _, points, batchIds, features, _, labels, _ = mTestDataSet.get_next_batch()
-                    points = torch.from_numpy(points).float().cuda()
-                    batchIds = torch.from_numpy(batchIds).int().cuda()
-                    features = torch.from_numpy(features).float().cuda()
-                    labels = torch.from_numpy(labels).long().cuda()
+                    points = points.to(device, non_blocking=True)
+                    batchIds = batchIds.to(device, non_blocking=True)
+                    features = features.to(device, non_blocking=True)
+                    labels = labels.to(device, non_blocking=True)
                     #check_deterministic_outputs(model, points, batchIds, features)
-                    logits = model(points, batchIds, features)
-                    xentropy_loss = create_loss(logits, labels)
-                    test_loss += xentropy_loss.item()
+                    logits, xentropy_loss = step_fn(model, points, batchIds, features, labels, amp_dtype)
+                    test_loss += xentropy_loss
 
-                    accuracy = create_accuracy(logits, labels)
-                    test_accuracy += accuracy
+                    correct, total = create_accuracy(logits, labels)
+                    test_correct += correct
+                    test_total += total
                     if num_iter % 30 == 0:
-                        print(f'B[{num_iter}] test loss: {test_loss/ num_iter} accuracy: {test_accuracy / num_iter}')
+                        loss_value, correct_value = torch.stack([test_loss.float(), test_correct.float()]).tolist()
+                        print(f'B[{num_iter}] test loss: {loss_value / num_iter} accuracy: {correct_value / test_total}')
                
-            test_accuracy /= num_iter
+            test_accuracy = test_correct.item() / test_total
             print(f"Test Accuracy: {test_accuracy:.4f}")
 
             checkpoint = {
@@ -328,8 +505,5 @@ if __name__ == '__main__':
             torch.save(checkpoint, 'checkpoint.pth')
             print('saving model weights')
 
-        if epoch % args.learningDecayRate == 0:
-            lr_scheduler.step()
-
     print(f"Training completed. Best test accuracy: {bestTestAccuracy:.4f}")
     git_commit_and_push()
@@ -0,0 +1,117 @@
+'''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
+    \file ModelNetTorchDataSet.py
+
+    \brief Wrapper to iterate over the ModelNet dataset with a torch DataLoader.
+
+    \copyright Copyright (c) 2018 Visual Computing group of Ulm University,
+                Germany. See the LICENSE file at the top-level directory of
+                this distribution.
+
+    \author pedro hermosilla (pedro-1.hermosilla-casajus@uni-ulm.de)
+'''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
+
+import math
+import time
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+class ModelNetTorchDataSet(IterableDataset):
+    """Iterable dataset that generates the batches of a ModelNetDataSet.
+
+    Each element generated by the iterator is a complete batch, so the DataLoader
+    should be created with batch_size=None. When the DataLoader uses several workers,
+    the batches of an epoch are distributed among them in a round robin fashion. In
+    that case the workers should be persistent, since the permutation of the models
+    of each epoch is computed from the number of epochs iterated by each worker.
+
+    Attributes:
+        dataSet_ (ModelNetDataSet): Wrapped dataset. It should be created without a
+            maximum number of points per batch.
+        seed_ (int): Seed used to compute the permutation of the models of each epoch.
+        epoch_ (int): Number of epochs iterated.
+    """
+
+    def __init__(self, dataSet, seed=None):
+        """Constructor.
+
+        Args:
+            dataSet (ModelNetDataSet): Wrapped dataset.
+            seed (int): Seed used to compute the permutation of the models of each epoch.
+                If None is provided instead, the current time on the machine will be used.
+        """
+        self.dataSet_ = dataSet
+        self.seed_ = seed if not(seed is None) else int(time.time())
+        self.epoch_ = 0
+
+
+    def __len__(self):
+        """Method to consult the number of batches in an epoch.
+
+        Returns:
+            numBatches (int): Number of batches in an epoch.
+        """
+        return int(math.ceil(float(self.dataSet_.get_num_models()) / float(self.dataSet_.batchSize_)))
+
+
+    def _sort_by_batch_(self, points, batchIds, features, labels):
+        """Method to sort the points of a batch by their model identifier, so the
+        points of each model are stored in a contiguous segment. The batches generated
+        by ModelNetDataSet are already sorted, in which case the arrays are not copied.
+
+        Args:
+            points (nx3 np.array): List of points of the batch.
+            batchIds (nx1 np.array): List of model indentifiers within the batch for each point.
+            features (nxm np.array): List of point features.
+            labels (nxl np.array): List of point labels, or None.
+
+        Returns:
+            points (nx3 np.array): Sorted list of points of the batch.
+            batchIds (nx1 np.array): Sorted list of model indentifiers.
+            features (nxm np.array): Sorted list of point features.
+            labels (nxl np.array): Sorted list of point labels, or None.
+        """
+        if np.all(batchIds[1:, 0] >= batchIds[:-1, 0]):
+            return points, batchIds, features, labels
+
+        order = np.argsort(batchIds[:, 0], kind='stable')
+        if not(labels is None):
+            labels = labels[order]
+        return points[order], batchIds[order], features[order], labels
+
+
+    def __iter__(self):
+        """Method to iterate over the batches of an epoch.
+
+        The points of each batch are sorted by their model identifier.
+
+        Returns:
+            numModelInBatch (int): Number of models in the batch.
+            points (nx3 tensor): List of points of the batch.
+            batchIds (n tensor): List of model indentifiers within the batch for each point.
+            features (nxm tensor): List of point features.
+            labels (nxl np.array): List of point labels, or None.
+            categories (numModelInBatch int64 tensor): List of categories of each model in the batch.
+            paths (array of strings): List of paths to the models used in the batch.
+        """
+        workerId = 0
+        numWorkers = 1
+        workerInfo = get_worker_info()
+        if not(workerInfo is None):
+            workerId = workerInfo.id
+            numWorkers = workerInfo.num_workers
+            # Each worker samples the models with a different random generator.
+            if self.epoch_ == 0:
+                self.dataSet_.randomState_ = np.random.RandomState(workerInfo.seed % (2**32))
+
+        # All the workers use the same permutation of the models.
+        self.dataSet_.randomSelection_ = np.random.RandomState((self.seed_ + self.epoch_) % (2**32)).permutation(
+            self.dataSet_.get_num_models())
+        self.epoch_ += 1
+
+        for batchIter in range(workerId, len(self), numWorkers):
+            self.dataSet_.iterator_ = batchIter * self.dataSet_.batchSize_
+            numModelInBatch, points, batchIds, features, labels, categories, paths = self.dataSet_.get_next_batch()
+            points, batchIds, features, labels = self._sort_by_batch_(points, batchIds, features, labels)
+            yield numModelInBatch, torch.from_numpy(points).float(), torch.from_numpy(batchIds.reshape(-1)).int(), \
+                torch.from_numpy(features).float(), labels, torch.as_tensor(categories, dtype=torch.long), paths
@@ -135,7 +135,7 @@ def create_network(points, batchIds, features, numInputFeatures, batchSize, k, n
         convName="Conv_2_2", 
         inPointHierarchy=mPointHierarchy,
         inPointLevel=1, 
-        inFeatures=mPointHierarchy.features_[1], 
+        inFeatures=mPointHierarchy.levels_[1].features, 
         inNumFeatures=numInputFeatures, 
         outNumFeatures=k*2,
         convRadius= 0.4,
@@ -12,7 +12,9 @@
 /////////////////////////////////////////////////////////////////////////////
 
 #include <torch/extension.h>
+#include "tensor_checks.h"
 #include <tuple>
+#include <float.h>
 
 namespace pt_mcc
 {
@@ -21,8 +23,9 @@ namespace pt_mcc
         const bool pScaleInv, const int pNumPoints, const int64_t pBatchSize,
         const float *pPoints, const int *pBatchIds, float *pAABBMin, float *pAABBMax);
 
-    std::tuple<torch::Tensor, at::Tensor> compute_aabb(
-        torch::Tensor points, torch::Tensor batchIds, int64_t batchSize, bool scaleInv)
+    std::tuple<torch::Tensor &, torch::Tensor &> compute_aabb_out(
+        torch::Tensor points, torch::Tensor batchIds, int64_t batchSize, bool scaleInv,
+        torch::Tensor &aabbMin, torch::Tensor &aabbMax)
     {
         // Check input tensor dimensions and types
         TORCH_CHECK(points.dim() == 2, "Points should have 2 dimensions (numPoints, pointComponents)");
@@ -34,12 +37,17 @@ namespace pt_mcc
         // auto pointSize = points.size(1);
 
         // Ensure batch_ids size matches num_points
-        TORCH_CHECK(batchIds.dim() == 2 && batchIds.size(1) == 1, "Batch IDs should have shape (N, 1)");
-        TORCH_CHECK(batchIds.size(0) == numPoints, "Batch IDs should have the same number of points");
+        TORCH_CHECK(is_valid_batch_ids(batchIds, numPoints), "Batch IDs should be a contiguous int32 tensor with shape (N) or (N, 1)");
 
-        // Allocate output tensors
-        torch::Tensor aabbMin = torch::empty({batchSize, 3}, points.options());
-        torch::Tensor aabbMax = torch::empty({batchSize, 3}, points.options());
+        // Check the output tensors
+        TORCH_CHECK(aabbMin.dtype() == at::kFloat && aabbMax.dtype() == at::kFloat, "AABB tensors should be float");
+        TORCH_CHECK(aabbMin.is_contiguous() && aabbMax.is_contiguous(), "AABB tensors should be contiguous");
+        TORCH_CHECK(aabbMin.sizes() == torch::IntArrayRef({batchSize, 3}), "AABB min should have shape (batchSize, 3)");
+        TORCH_CHECK(aabbMax.sizes() == torch::IntArrayRef({batchSize, 3}), "AABB max should have shape (batchSize, 3)");
+
+        // The kernel reduces the points into the output tensors
+        aabbMin.fill_(FLT_MAX);
+        aabbMax.fill_(-FLT_MAX);
 
         // Call the CUDA kernel (passing raw pointers to the tensors)
         computeAABB(
@@ -47,23 +55,38 @@ namespace pt_mcc
             points.data_ptr<float>(), batchIds.data_ptr<int>(),
             aabbMin.data_ptr<float>(), aabbMax.data_ptr<float>());
 
+        return std::forward_as_tuple(aabbMin, aabbMax);
+    }
+
+    std::tuple<torch::Tensor, at::Tensor> compute_aabb(
+        torch::Tensor points, torch::Tensor batchIds, int64_t batchSize, bool scaleInv)
+    {
+        // Allocate output tensors
+        torch::Tensor aabbMin = torch::empty({batchSize, 3}, points.options());
+        torch::Tensor aabbMax = torch::empty({batchSize, 3}, points.options());
+
+        compute_aabb_out(points, batchIds, batchSize, scaleInv, aabbMin, aabbMax);
+
         return std::make_tuple(aabbMin, aabbMax);
     }
 
     void register_aabb(torch::Library &m)
     {
         m.def("compute_aabb(Tensor points, Tensor batchIds, int batchSize, bool scaleInv) -> (Tensor, Tensor)");
+        m.def("compute_aabb.out(Tensor points, Tensor batchIds, int batchSize, bool scaleInv, *, Tensor(a!) aabbMin, Tensor(b!) aabbMax) -> (Tensor(a!), Tensor(b!))");
     }
 
     // Register CPU implementations
     TORCH_LIBRARY_IMPL(pt_mcc, CPU, m)
     {
         m.impl("compute_aabb", &compute_aabb);
+        m.impl("compute_aabb.out", &compute_aabb_out);
     }
 
     // Register CUDA implementations
     TORCH_LIBRARY_IMPL(pt_mcc, CUDA, m)
     {
         m.impl("compute_aabb", &compute_aabb);
+        m.impl("compute_aabb.out", &compute_aabb_out);
     }
 }
\ No newline at end of file
@@ -1,4 +1,5 @@
 #include <torch/extension.h>
+#include "tensor_checks.h"
 #include <cuda_runtime.h>
 
 namespace pt_mcc
@@ -39,14 +40,13 @@ namespace pt_mcc
         TORCH_CHECK(points.dim() == 2 && points.size(1) == 3, "Points should have shape (N, 3)");
         int num_points = points.size(0);
 
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(1) == 1, "Batch IDs should have shape (N, 1)");
-        TORCH_CHECK(batch_ids.size(0) == num_points, "batch_ids should match the first dimension of points");
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, num_points), "Batch IDs should be a contiguous int32 tensor with shape (N) or (N, 1)");
 
-        TORCH_CHECK(start_indexes.dim() == 2 && start_indexes.size(1) == 1, "Start indexes (Samples) should have shape (N_sample, 1)");
+        TORCH_CHECK(start_indexes.dim() == 2 && start_indexes.size(1) == 1 && is_int32_indices(start_indexes), "Start indexes (Samples) should be contiguous int32 with shape (N_sample, 1)");
         int num_samples = start_indexes.size(0);
 
-        TORCH_CHECK(neighbors.dim() == 2 && neighbors.size(1) == 2,
-                    "neighbors should have shape (N_neighbor, 2))");
+        TORCH_CHECK(neighbors.dim() == 2 && neighbors.size(1) == 2 && is_int32_indices(neighbors),
+                    "neighbors should be contiguous int32 with shape (N_neighbor, 2))");
         int num_neighbors = neighbors.size(0);
 
         TORCH_CHECK(aabb_min.dim() == 2 && aabb_min.size(1) == 3 && aabb_min.size(0) == batch_size,
@@ -13,19 +13,28 @@
 #include <cstdio>
 #include <float.h>
 
+#include <ATen/cuda/CUDAContext.h>
+
 #include "cuda_kernel_utils.h"
 #include <cuda.h>
 #include <cuda_runtime.h>
 
 #define POINT_BLOCK_SIZE 256
 
+#define WARP_SIZE 32
+#define MAX_BLOCKS_PER_SM 4
+
 /*
 Implementation:
-The AABB for a batch of point clouds is computed by iterating through the points,
-determining their corresponding batch, and using atomic operations to find the
-minimum and maximum values across all threads. The use of atomic operations ensures
-thread safety when updating shared memory locations, allowing for correct computation
-of the bounding box even with concurrent access.
+The AABB for a batch of point clouds is computed with a block-level reduction.
+Each block iterates over the points with a grid-stride loop and accumulates the
+bounding boxes of the batches it visits in shared memory. Since the points of a
+batch are usually stored contiguously, the warps whose points all belong to the
+same batch first reduce them with warp shuffles, and only one lane updates the
+shared memory. Once all the points of the block have been processed, each block
+updates the global bounding boxes with a single atomic operation per batch and
+component. If the bounding boxes are not scale invariant, a second kernel
+computes the union of the bounding boxes of all the batches.
 */
 
 ////////////////////////////////////////////////////////////////////////////////// GPU
@@ -58,8 +67,8 @@ namespace pt_mcc
     }
 
     /**
-     *  Method to compute the bounding box of a point cloud.
-     *  @param  pScaleInv       Scale invariance.
+     *  Method to compute the bounding box of each point cloud of the batch.
+     *  The output bounding boxes should be initialized before calling the kernel.
      *  @param  pNumPoints      Number of points.
      *  @param  pBatchSize      Size of the batch.
      *  @param  pPoints         List of points.
@@ -68,7 +77,6 @@ namespace pt_mcc
      *  @param  pAABBMax        Output parameter with the maximum point of the bounding box.
      */
     __global__ void comp_AABB(
-        const bool pScaleInv,
         const int pNumPoints,
         const int64_t pBatchSize,
         const float *__restrict__ pPoints,
@@ -77,60 +85,106 @@ namespace pt_mcc
         float *__restrict__ pAABBMax)
     {
         extern __shared__ float tmpSharedMemPtr[];
+        float *sharedAABBMin = tmpSharedMemPtr;
+        float *sharedAABBMax = &tmpSharedMemPtr[pBatchSize * 3];
 
-        int currentIndex = threadIdx.x + blockIdx.x * blockDim.x;
-        if (currentIndex < pNumPoints)
+        for (int i = threadIdx.x; i < pBatchSize * 3; i += blockDim.x)
         {
+            sharedAABBMin[i] = FLT_MAX;
+            sharedAABBMax[i] = -FLT_MAX;
+        }
 
-            if (threadIdx.x < pBatchSize)
-            {
-                tmpSharedMemPtr[threadIdx.x * 3] = FLT_MAX;
-                tmpSharedMemPtr[threadIdx.x * 3 + 1] = FLT_MAX;
-                tmpSharedMemPtr[threadIdx.x * 3 + 2] = FLT_MAX;
-                tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3] = -FLT_MAX;
-                tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3 + 1] = -FLT_MAX;
-                tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3 + 2] = -FLT_MAX;
-            }
-
-            __syncthreads();
-
-            int batchId = pBatchIds[currentIndex];
-            float *aabbMin = &tmpSharedMemPtr[batchId * 3];
-            float *aabbMax = &tmpSharedMemPtr[pBatchSize * 3 + batchId * 3];
-
-            int pointIndex = currentIndex * 3;
-            atomicMin(&aabbMin[0], pPoints[pointIndex]);
-            atomicMin(&aabbMin[1], pPoints[pointIndex + 1]);
-            atomicMin(&aabbMin[2], pPoints[pointIndex + 2]);
-            atomicMax(&aabbMax[0], pPoints[pointIndex]);
-            atomicMax(&aabbMax[1], pPoints[pointIndex + 1]);
-            atomicMax(&aabbMax[2], pPoints[pointIndex + 2]);
+        __syncthreads();
 
-            __syncthreads();
+        int laneId = threadIdx.x % WARP_SIZE;
+        // All the threads of a warp execute the same number of iterations, so the
+        // warp intrinsics are always called with all the lanes active.
+        for (int warpStart = blockIdx.x * blockDim.x + threadIdx.x - laneId;
+             warpStart < pNumPoints; warpStart += gridDim.x * blockDim.x)
+        {
+            int currentIndex = warpStart + laneId;
+            bool validPoint = currentIndex < pNumPoints;
 
-            if (threadIdx.x < pBatchSize)
+            float minPt[3] = {FLT_MAX, FLT_MAX, FLT_MAX};
+            float maxPt[3] = {-FLT_MAX, -FLT_MAX, -FLT_MAX};
+            int batchId = -1;
+            if (validPoint)
             {
-                if (pScaleInv)
+                batchId = pBatchIds[currentIndex];
+                for (int j = 0; j < 3; ++j)
                 {
-                    atomicMin(&pAABBMin[threadIdx.x * 3], tmpSharedMemPtr[threadIdx.x * 3]);
-                    atomicMin(&pAABBMin[threadIdx.x * 3 + 1], tmpSharedMemPtr[threadIdx.x * 3 + 1]);
-                    atomicMin(&pAABBMin[threadIdx.x * 3 + 2], tmpSharedMemPtr[threadIdx.x * 3 + 2]);
-                    atomicMax(&pAABBMax[threadIdx.x * 3], tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3]);
-                    atomicMax(&pAABBMax[threadIdx.x * 3 + 1], tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3 + 1]);
-                    atomicMax(&pAABBMax[threadIdx.x * 3 + 2], tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3 + 2]);
+                    minPt[j] = pPoints[currentIndex * 3 + j];
+                    maxPt[j] = minPt[j];
                 }
-                else
+            }
+
+            // The first lane of the warp always has a valid point.
+            int warpBatchId = __shfl_sync(0xffffffff, batchId, 0);
+            if (!validPoint)
+                batchId = warpBatchId;
+
+            if (__all_sync(0xffffffff, batchId == warpBatchId))
+            {
+                for (int offset = WARP_SIZE / 2; offset > 0; offset /= 2)
                 {
-                    for (int i = 0; i < pBatchSize; ++i)
+                    for (int j = 0; j < 3; ++j)
                     {
-                        atomicMin(&pAABBMin[i * 3], tmpSharedMemPtr[threadIdx.x * 3]);
-                        atomicMin(&pAABBMin[i * 3 + 1], tmpSharedMemPtr[threadIdx.x * 3 + 1]);
-                        atomicMin(&pAABBMin[i * 3 + 2], tmpSharedMemPtr[threadIdx.x * 3 + 2]);
-                        atomicMax(&pAABBMax[i * 3], tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3]);
-                        atomicMax(&pAABBMax[i * 3 + 1], tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3 + 1]);
-                        atomicMax(&pAABBMax[i * 3 + 2], tmpSharedMemPtr[pBatchSize * 3 + threadIdx.x * 3 + 2]);
+                        minPt[j] = fminf(minPt[j], __shfl_down_sync(0xffffffff, minPt[j], offset));
+                        maxPt[j] = fmaxf(maxPt[j], __shfl_down_sync(0xffffffff, maxPt[j], offset));
                     }
                 }
+                validPoint = laneId == 0;
+            }
+
+            if (validPoint)
+            {
+                for (int j = 0; j < 3; ++j)
+                {
+                    atomicMin(&sharedAABBMin[batchId * 3 + j], minPt[j]);
+                    atomicMax(&sharedAABBMax[batchId * 3 + j], maxPt[j]);
+                }
+            }
+        }
+
+        __syncthreads();
+
+        for (int i = threadIdx.x; i < pBatchSize * 3; i += blockDim.x)
+        {
+            // Skip the batches without points in this block.
+            if (sharedAABBMin[i] <= sharedAABBMax[i])
+            {
+                atomicMin(&pAABBMin[i], sharedAABBMin[i]);
+                atomicMax(&pAABBMax[i], sharedAABBMax[i]);
+            }
+        }
+    }
+
+    /**
+     *  Method to replace the bounding box of each point cloud by the union
+     *  of the bounding boxes of all the point clouds of the batch.
+     *  @param  pBatchSize      Size of the batch.
+     *  @param  pAABBMin        Input/Output parameter with the minimum point of the bounding box.
+     *  @param  pAABBMax        Input/Output parameter with the maximum point of the bounding box.
+     */
+    __global__ void union_AABB(
+        const int64_t pBatchSize,
+        float *__restrict__ pAABBMin,
+        float *__restrict__ pAABBMax)
+    {
+        int component = threadIdx.x;
+        if (component < 3)
+        {
+            float minVal = FLT_MAX;
+            float maxVal = -FLT_MAX;
+            for (int i = 0; i < pBatchSize; ++i)
+            {
+                minVal = fminf(minVal, pAABBMin[i * 3 + component]);
+                maxVal = fmaxf(maxVal, pAABBMax[i * 3 + component]);
+            }
+            for (int i = 0; i < pBatchSize; ++i)
+            {
+                pAABBMin[i * 3 + component] = minVal;
+                pAABBMax[i * 3 + component] = maxVal;
             }
         }
     }
@@ -146,18 +200,24 @@ namespace pt_mcc
         float *pAABBMin,
         float *pAABBMax)
     {
-        float maxFlt[pBatchSize * 3];
-        float minFlt[pBatchSize * 3];
-        for (int i = 0; i < pBatchSize * 3; ++i)
+        if (pNumPoints > 0)
+        {
+            int device, numSMs;
+            gpuErrchk(cudaGetDevice(&device));
+            gpuErrchk(cudaDeviceGetAttribute(&numSMs, cudaDevAttrMultiProcessorCount, device));
+            int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
+            numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
+            numBlocksPoints = min(numBlocksPoints, numSMs * MAX_BLOCKS_PER_SM);
+            comp_AABB<<<numBlocksPoints, POINT_BLOCK_SIZE, pBatchSize * 6 * sizeof(float), at::cuda::getCurrentCUDAStream()>>>(
+                pNumPoints, pBatchSize, pPoints, pBatchIds, pAABBMin, pAABBMax);
+            gpuErrchk(cudaPeekAtLastError());
+        }
+
+        if (!pScaleInv)
         {
-            maxFlt[i] = FLT_MAX;
-            minFlt[i] = -FLT_MAX;
+            union_AABB<<<1, WARP_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pBatchSize, pAABBMin, pAABBMax);
+            gpuErrchk(cudaPeekAtLastError());
         }
-        gpuErrchk(cudaMemcpy(pAABBMin, &maxFlt[0], pBatchSize * 3 * sizeof(float), cudaMemcpyHostToDevice));
-        gpuErrchk(cudaMemcpy(pAABBMax, &minFlt[0], pBatchSize * 3 * sizeof(float), cudaMemcpyHostToDevice));
-        int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
-        numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
-        comp_AABB<<<numBlocksPoints, POINT_BLOCK_SIZE, pBatchSize * 6 * sizeof(float)>>>(pScaleInv, pNumPoints, pBatchSize, pPoints, pBatchIds, pAABBMin, pAABBMax);
     }
 
 }
\ No newline at end of file
@@ -16,6 +16,8 @@
 #include <iostream>
 #include <fstream>
 
+#include <ATen/cuda/CUDAContext.h>
+
 #include "cuda_kernel_utils.h"
 
 #define NEIGHBOR_BLOCK_PDF_SIZE 256
@@ -115,7 +117,7 @@ namespace pt_mcc
         // Compute the PDF.
         dim3 gridDimension = computeBlockGrid(pNumNeighbors, NEIGHBOR_BLOCK_PDF_SIZE);
 
-        computePDFs<<<gridDimension, NEIGHBOR_BLOCK_PDF_SIZE>>>(scaleInv, pWindow, numSamples, pNumNeighbors,
+        computePDFs<<<gridDimension, NEIGHBOR_BLOCK_PDF_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(scaleInv, pWindow, numSamples, pNumNeighbors,
                                                                 pRadius, pAABBMin, pAABBMax, pInPts, pInBatchIds, pStartIndexs, pPackedIndexs, pPDFs);
 
         gpuErrchk(cudaPeekAtLastError());
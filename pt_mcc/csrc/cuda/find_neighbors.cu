@@ -15,6 +15,9 @@
 #include <iostream>
 #include <fstream>
 
+#include <ATen/cuda/CUDAContext.h>
+#include <c10/cuda/CUDACachingAllocator.h>
+
 #include "cuda_kernel_utils.h"
 
 #define POINT_BLOCK_SIZE 128
@@ -294,23 +297,24 @@ namespace pt_mcc
         // Init device symbols.
         int cellOffsetsCPU[27][3] = {
             {1, 1, 1}, {0, 1, 1}, {-1, 1, 1}, {1, 0, 1}, {0, 0, 1}, {-1, 0, 1}, {1, -1, 1}, {0, -1, 1}, {-1, -1, 1}, {1, 1, 0}, {0, 1, 0}, {-1, 1, 0}, {1, 0, 0}, {0, 0, 0}, {-1, 0, 0}, {1, -1, 0}, {0, -1, 0}, {-1, -1, 0}, {1, 1, -1}, {0, 1, -1}, {-1, 1, -1}, {1, 0, -1}, {0, 0, -1}, {-1, 0, -1}, {1, -1, -1}, {0, -1, -1}, {-1, -1, -1}};
-        cudaMemcpyToSymbol(cellOffsets, cellOffsetsCPU, 27 * 3 * sizeof(int));
+        cudaMemcpyToSymbolAsync(cellOffsets, cellOffsetsCPU, 27 * 3 * sizeof(int), 0, cudaMemcpyHostToDevice, at::cuda::getCurrentCUDAStream());
 
         int numBlocksPoints = (pNumPoints + POINT_BLOCK_SIZE - 1) / POINT_BLOCK_SIZE;
 
         // Find the neighbors for each point.
         int *totalNeighbors;
-        gpuErrchk(cudaMalloc(&totalNeighbors, sizeof(int)));
-        gpuErrchk(cudaMemset(totalNeighbors, 0, sizeof(int)));
+        totalNeighbors = static_cast<int *>(c10::cuda::CUDACachingAllocator::raw_alloc(sizeof(int)));
+        gpuErrchk(cudaMemsetAsync(totalNeighbors, 0, sizeof(int), at::cuda::getCurrentCUDAStream()));
 
-        countNeighbors<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pScaleInv, pNumPoints, pNumCells,
+        countNeighbors<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pScaleInv, pNumPoints, pNumCells,
                                                               pRadius, pAABBMin, pAABBMax, pInPts, pInBatchIds, pInPts2, pCellIndexs, pStartIndex, totalNeighbors);
 
         gpuErrchk(cudaPeekAtLastError());
 
         int totalNeighborsCPU = 0;
-        gpuErrchk(cudaMemcpy(&totalNeighborsCPU, totalNeighbors, sizeof(int), cudaMemcpyDeviceToHost)); // an illegal memory access was encountered /workspace/MCC-Pytorch/pt_mcc/csrc/cuda/find_neighbors.cu
-        gpuErrchk(cudaFree(totalNeighbors));
+        gpuErrchk(cudaMemcpyAsync(&totalNeighborsCPU, totalNeighbors, sizeof(int), cudaMemcpyDeviceToHost, at::cuda::getCurrentCUDAStream())); // an illegal memory access was encountered /workspace/MCC-Pytorch/pt_mcc/csrc/cuda/find_neighbors.cu
+        gpuErrchk(cudaStreamSynchronize(at::cuda::getCurrentCUDAStream()));
+        c10::cuda::CUDACachingAllocator::raw_delete(totalNeighbors);
 
 #ifdef PRINT_CONV_INFO
         printf("Forward Num points: %d | Neighbors: %d\n", pNumPoints, totalNeighborsCPU);
@@ -354,20 +358,20 @@ namespace pt_mcc
         int numBlocksPointsPack2 = numBlocksPointsPack / POINT_BLOCK_PACK_SIZE;
         numBlocksPointsPack2 += (numBlocksPointsPack % POINT_BLOCK_PACK_SIZE != 0) ? 1 : 0;
 
-        gpuErrchk(cudaMemset(pAuxBuffOffsets, 0, sizeof(int) * numBlocksPointsPack));
-        gpuErrchk(cudaMemset(pAuxBuffOffsets2, 0, sizeof(int) * numBlocksPointsPack2));
+        gpuErrchk(cudaMemsetAsync(pAuxBuffOffsets, 0, sizeof(int) * numBlocksPointsPack, at::cuda::getCurrentCUDAStream()));
+        gpuErrchk(cudaMemsetAsync(pAuxBuffOffsets2, 0, sizeof(int) * numBlocksPointsPack2, at::cuda::getCurrentCUDAStream()));
 
-        computeOffsets<<<numBlocksPointsPack, POINT_BLOCK_PACK_SIZE>>>(true, pNumPoints, numBlocksPointsPack, pStartIndexs, pAuxBuffOffsets);
+        computeOffsets<<<numBlocksPointsPack, POINT_BLOCK_PACK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(true, pNumPoints, numBlocksPointsPack, pStartIndexs, pAuxBuffOffsets);
 
         gpuErrchk(cudaPeekAtLastError());
 
-        computeOffsets<<<numBlocksPointsPack2, POINT_BLOCK_PACK_SIZE>>>(false, numBlocksPointsPack, numBlocksPointsPack2, pAuxBuffOffsets, pAuxBuffOffsets2);
+        computeOffsets<<<numBlocksPointsPack2, POINT_BLOCK_PACK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(false, numBlocksPointsPack, numBlocksPointsPack2, pAuxBuffOffsets, pAuxBuffOffsets2);
 
         gpuErrchk(cudaPeekAtLastError());
 
         int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
-        findNeighbors<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pScaleInv, pNumPoints, pNumCells, pNumNeighbors, pRadius, pAABBMin, pAABBMax,
+        findNeighbors<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pScaleInv, pNumPoints, pNumCells, pNumNeighbors, pRadius, pAABBMin, pAABBMax,
                                                              pInPts, pInBatchIds, pInPts2, pCellIndexs, pAuxBuffOffsets, pAuxBuffOffsets2, pStartIndexs, pPackedIndexs);
 
         gpuErrchk(cudaPeekAtLastError());
@@ -16,6 +16,9 @@
 #include <cstdio>
 #include <float.h>
 
+#include <ATen/cuda/CUDAContext.h>
+#include <c10/cuda/CUDACachingAllocator.h>
+
 #include "cuda_kernel_utils.h"
 
 #define BLOCK_SIZE 4
@@ -152,30 +155,6 @@ namespace pt_mcc
         }
     }
 
-    /**
-     *  Method to get the gradients of the features of the sampled points.
-     *  @param  pNumSamples                 Number of samples.
-     *  @param  pNumFeatures                Number of features.
-     *  @param  pSampledIndexs              List of indexs of the sampled points.
-     *  @param  pFeaturesGrads              List of gradients of output features.
-     *  @param  pOutSampledFeaturesGrads    List of output gradients of input features.
-     */
-    __global__ void selectFeatureSamplesGrad(
-        const int pNumSamples,
-        const int pNumFeatures,
-        const int *__restrict__ pSampledIndexs,
-        const float *__restrict__ pFeaturesGrads,
-        float *__restrict__ pOutSampledFeaturesGrads)
-    {
-        int currentIndex = threadIdx.x + blockIdx.x * blockDim.x;
-        int sampleIndex = currentIndex / pNumFeatures;
-        int featureIndex = currentIndex % pNumFeatures;
-        if (sampleIndex < pNumSamples)
-        {
-            pOutSampledFeaturesGrads[pSampledIndexs[sampleIndex] * pNumFeatures + featureIndex] = pFeaturesGrads[currentIndex];
-        }
-    }
-
     ////////////////////////////////////////////////////////////////////////////////// CPU
 
     int samplePointCloud(
@@ -197,14 +176,14 @@ namespace pt_mcc
         // Init device symbols.
         int cellOffsetsPoolCPU[27][3] = {
             {1, 1, -1}, {0, -1, 1}, {0, 1, 1}, {0, 1, 0}, {0, 0, 1}, {0, -1, 0}, {-1, 1, -1}, {0, -1, -1}, {1, 0, 0}, {1, -1, 1}, {1, 0, 1}, {-1, 1, 1}, {-1, 0, 0}, {1, -1, -1}, {0, 1, -1}, {-1, -1, 0}, {-1, 1, 0}, {0, 0, 0}, {0, 0, -1}, {1, 1, 0}, {1, 0, -1}, {1, -1, 0}, {-1, 0, 1}, {1, 1, 1}, {-1, 0, -1}, {-1, -1, -1}, {-1, -1, 1}};
-        gpuErrchk(cudaMemcpyToSymbol(cellOffsetsPool, cellOffsetsPoolCPU, 27 * 3 * sizeof(int)));
+        gpuErrchk(cudaMemcpyToSymbolAsync(cellOffsetsPool, cellOffsetsPoolCPU, 27 * 3 * sizeof(int), 0, cudaMemcpyHostToDevice, at::cuda::getCurrentCUDAStream()));
         int numSelectedPointsCPU = 0;
 
-        gpuErrchk(cudaMemset(pAuxBoolBuffer, 0, sizeof(bool) * pNumPoints));
+        gpuErrchk(cudaMemsetAsync(pAuxBoolBuffer, 0, sizeof(bool) * pNumPoints, at::cuda::getCurrentCUDAStream()));
 
         int *numSelectedPoints;
-        gpuErrchk(cudaMalloc(&numSelectedPoints, sizeof(int)));
-        gpuErrchk(cudaMemset(numSelectedPoints, 0, sizeof(int)));
+        numSelectedPoints = static_cast<int *>(c10::cuda::CUDACachingAllocator::raw_alloc(sizeof(int)));
+        gpuErrchk(cudaMemsetAsync(numSelectedPoints, 0, sizeof(int), at::cuda::getCurrentCUDAStream()));
 
         int numPhaseGroups = pNumCells / 3;
         numPhaseGroups += (pNumCells % 3 != 0) ? 1 : 0;
@@ -214,7 +193,7 @@ namespace pt_mcc
         {
             for (int i = 0; i < 27; ++i)
             {
-                selectSamples<<<dim3(numBlocks, numBlocks, numBlocks), dim3(BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)>>>(scaleInv, b, i, pNumPoints, pBatchSize, pNumCells, pRadius, pAABBMin,
+                selectSamples<<<dim3(numBlocks, numBlocks, numBlocks), dim3(BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE), 0, at::cuda::getCurrentCUDAStream()>>>(scaleInv, b, i, pNumPoints, pBatchSize, pNumCells, pRadius, pAABBMin,
                                                                                                                    pAABBMax, pPoints, pBatchIds, pCellIndexs, pAuxBoolBuffer, pSelectedPts,
                                                                                                                    pSelectedBatchIds, pSelectedIndexs, numSelectedPoints);
 
@@ -223,8 +202,9 @@ namespace pt_mcc
         }
 
         // Copy from GPU the number of selected samples.
-        gpuErrchk(cudaMemcpy(&numSelectedPointsCPU, numSelectedPoints, sizeof(int), cudaMemcpyDeviceToHost));
-        gpuErrchk(cudaFree(numSelectedPoints));
+        gpuErrchk(cudaMemcpyAsync(&numSelectedPointsCPU, numSelectedPoints, sizeof(int), cudaMemcpyDeviceToHost, at::cuda::getCurrentCUDAStream()));
+        gpuErrchk(cudaStreamSynchronize(at::cuda::getCurrentCUDAStream()));
+        c10::cuda::CUDACachingAllocator::raw_delete(numSelectedPoints);
 
 #ifdef PRINT_CONV_INFO
         printf("Num Cells: %d | Input points: %d | Result pooling: %d\n", pNumCells, pNumPoints, numSelectedPointsCPU);
@@ -242,9 +222,9 @@ namespace pt_mcc
         int *pDestBatchIds,
         int *pDestIndexs)
     {
-        gpuErrchk(cudaMemcpy(pDestPts, pSelectedPts, sizeof(float) * 3 * pNumPts, cudaMemcpyDeviceToDevice));
-        gpuErrchk(cudaMemcpy(pDestBatchIds, pSelectedBatchIds, sizeof(int) * pNumPts, cudaMemcpyDeviceToDevice));
-        gpuErrchk(cudaMemcpy(pDestIndexs, pSelectedIndexs, sizeof(int) * pNumPts, cudaMemcpyDeviceToDevice));
+        gpuErrchk(cudaMemcpyAsync(pDestPts, pSelectedPts, sizeof(float) * 3 * pNumPts, cudaMemcpyDeviceToDevice, at::cuda::getCurrentCUDAStream()));
+        gpuErrchk(cudaMemcpyAsync(pDestBatchIds, pSelectedBatchIds, sizeof(int) * pNumPts, cudaMemcpyDeviceToDevice, at::cuda::getCurrentCUDAStream()));
+        gpuErrchk(cudaMemcpyAsync(pDestIndexs, pSelectedIndexs, sizeof(int) * pNumPts, cudaMemcpyDeviceToDevice, at::cuda::getCurrentCUDAStream()));
     }
 
     void getFeaturesSampledPoints(
@@ -257,23 +237,7 @@ namespace pt_mcc
     {
         int numBlocksPoints = pNumSampledPoints / PT_BLOCK_SIZE;
         numBlocksPoints += (pNumSampledPoints % PT_BLOCK_SIZE != 0) ? 1 : 0;
-        selectFeatureSamples<<<pNumSampledPoints, PT_BLOCK_SIZE>>>(pNumSampledPoints, pNumFeatures, pInPointsIndexs, pInFeature, pOutSelFeatures);
-        gpuErrchk(cudaPeekAtLastError());
-    }
-
-    void getFeaturesSampledPointsGradients(
-        int pNumPoints,
-        int pNumFeatures,
-        int pNumSampledPoints,
-        const int *pInPointsIndexs,
-        const float *pInOutFeatureGrad,
-        float *pOutInFeaturesGradients)
-    {
-        gpuErrchk(cudaMemset(pOutInFeaturesGradients, 0, sizeof(int) * pNumFeatures * pNumPoints));
-
-        int numBlocksPoints = pNumSampledPoints / PT_BLOCK_SIZE;
-        numBlocksPoints += (pNumSampledPoints % PT_BLOCK_SIZE != 0) ? 1 : 0;
-        selectFeatureSamplesGrad<<<pNumSampledPoints, PT_BLOCK_SIZE>>>(pNumSampledPoints, pNumFeatures, pInPointsIndexs, pInOutFeatureGrad, pOutInFeaturesGradients);
+        selectFeatureSamples<<<pNumSampledPoints, PT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumSampledPoints, pNumFeatures, pInPointsIndexs, pInFeature, pOutSelFeatures);
         gpuErrchk(cudaPeekAtLastError());
     }
 
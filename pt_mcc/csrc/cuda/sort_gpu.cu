@@ -14,6 +14,9 @@
 
 #include <cstdio>
 
+#include <ATen/cuda/CUDAContext.h>
+#include <c10/cuda/CUDACachingAllocator.h>
+
 #include "cuda_kernel_utils.h"
 
 #define POINT_BLOCK_SIZE 128
@@ -428,14 +431,15 @@ namespace pt_mcc
         }
 
         int *numCells;
-        cudaMalloc(&numCells, sizeof(int));
-        cudaMemset(numCells, 0x3F, sizeof(int));
+        numCells = static_cast<int *>(c10::cuda::CUDACachingAllocator::raw_alloc(sizeof(int)));
+        cudaMemsetAsync(numCells, 0x3F, sizeof(int), at::cuda::getCurrentCUDAStream());
 
-        determine_cell_size<<<1, pBatchSize>>>(pBatchSize, pCellSize, pAABBMin, pAABBMax, numCells);
+        determine_cell_size<<<1, pBatchSize, 0, at::cuda::getCurrentCUDAStream()>>>(pBatchSize, pCellSize, pAABBMin, pAABBMax, numCells);
 
         int numCellsCPU = 0;
-        cudaMemcpy(&numCellsCPU, numCells, sizeof(int), cudaMemcpyDeviceToHost);
-        gpuErrchk(cudaFree(numCells));
+        cudaMemcpyAsync(&numCellsCPU, numCells, sizeof(int), cudaMemcpyDeviceToHost, at::cuda::getCurrentCUDAStream());
+        cudaStreamSynchronize(at::cuda::getCurrentCUDAStream());
+        c10::cuda::CUDACachingAllocator::raw_delete(numCells);
         return numCellsCPU;
     }
 
@@ -471,27 +475,27 @@ namespace pt_mcc
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
         int totalNumCells = pBatchSize * pNumCells * pNumCells * pNumCells;
 
-        cudaMemset(pAuxBuffCounters, 0, totalNumCells * sizeof(int));
+        cudaMemsetAsync(pAuxBuffCounters, 0, totalNumCells * sizeof(int), at::cuda::getCurrentCUDAStream());
 
         int numOffsets = totalNumCells / OFFSET_BLOCK_SIZE;
         numOffsets += ((totalNumCells % OFFSET_BLOCK_SIZE) != 0) ? 1 : 0;
         int numOffsets2 = numOffsets / OFFSET_BLOCK_SIZE;
         numOffsets2 += ((numOffsets % OFFSET_BLOCK_SIZE) != 0) ? 1 : 0;
 
-        cudaMemset(pAuxBuffOffsets, 0, numOffsets * sizeof(int));
-        cudaMemset(pAuxBuffOffsets2, 0, numOffsets2 * sizeof(int));
+        cudaMemsetAsync(pAuxBuffOffsets, 0, numOffsets * sizeof(int), at::cuda::getCurrentCUDAStream());
+        cudaMemsetAsync(pAuxBuffOffsets2, 0, numOffsets2 * sizeof(int), at::cuda::getCurrentCUDAStream());
 
         // first store the Grid ID for each points in pKeys (empty and created in cpp file)
-        calc_key<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(
+        calc_key<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(
             pNumPoints, pBatchSize, pNumCells, pAABBMin, pAABBMax, pPoints, pBatchIds, pKeys);
         // save number of points in each cell in pAuxBuffCounters (batch_size, num_cell, num_cell, num_cell)
-        update_counters<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pKeys, pAuxBuffCounters);
+        update_counters<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pKeys, pAuxBuffCounters);
         // save accum sum not including itself within each block to the second last argumet; save total sum for each block in the last argument
-        propagate_offsets<<<numOffsets, OFFSET_BLOCK_SIZE>>>(true, totalNumCells, numOffsets, pAuxBuffCounters, pAuxBuffOffsets);
+        propagate_offsets<<<numOffsets, OFFSET_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(true, totalNumCells, numOffsets, pAuxBuffCounters, pAuxBuffOffsets);
         // when first argument set to false, it does an additional accumulation across chunks/blocks
-        propagate_offsets<<<numOffsets2, OFFSET_BLOCK_SIZE>>>(false, numOffsets, numOffsets2, pAuxBuffOffsets, pAuxBuffOffsets2);
+        propagate_offsets<<<numOffsets2, OFFSET_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(false, numOffsets, numOffsets2, pAuxBuffOffsets, pAuxBuffOffsets2);
         // pNewIndexs: local index from pAuxBuffCounters + offset from offset1 + offsets from offsets2
-        determine_new_index<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pKeys, pAuxBuffCounters, pAuxBuffOffsets,
+        determine_new_index<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pKeys, pAuxBuffCounters, pAuxBuffOffsets,
                                                                    pAuxBuffOffsets2, pNewIndexs);
     }
 
@@ -514,10 +518,10 @@ namespace pt_mcc
         int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
 
-        cudaMemset(pOutCellIndexs, 0, pBatchSize * pNumCells * pNumCells * pNumCells * sizeof(int) * 2);
+        cudaMemsetAsync(pOutCellIndexs, 0, pBatchSize * pNumCells * pNumCells * pNumCells * sizeof(int) * 2, at::cuda::getCurrentCUDAStream());
 
-        move_points<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pBatchSize, pNumFeatures, pPoints, pBatchIds, pFeatures, pKeys, pNewIndexs, pOutPoints, pOutBatchIds, pOutFeatures, pAuxBuffer);
-        save_indexs<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pAuxBuffer, pOutCellIndexs);
+        move_points<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pBatchSize, pNumFeatures, pPoints, pBatchIds, pFeatures, pKeys, pNewIndexs, pOutPoints, pOutBatchIds, pOutFeatures, pAuxBuffer);
+        save_indexs<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pAuxBuffer, pOutCellIndexs);
     }
 
     void sortPointsStep2GradGPUKernel(
@@ -532,7 +536,7 @@ namespace pt_mcc
         int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
 
-        compute_gradients<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pNumFeatures, pOutGradients, pOutFeatureGradients, pNewIndexs, pInGradients, pInFeatureGradients);
+        compute_gradients<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pNumFeatures, pOutGradients, pOutFeatureGradients, pNewIndexs, pInGradients, pInFeatureGradients);
     }
 
     void sortFeaturesBack(
@@ -545,7 +549,7 @@ namespace pt_mcc
         int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
 
-        sort_features_back<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pNumFeatures, pInFeatures, pIndexs, pOutFeatures);
+        sort_features_back<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pNumFeatures, pInFeatures, pIndexs, pOutFeatures);
     }
 
     void sortFeaturesBackGrad(
@@ -558,7 +562,7 @@ namespace pt_mcc
         int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
 
-        sort_features_back_grad<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pNumFeatures, pOutFeatureGrads, pIndexs, pInFeatureGrads);
+        sort_features_back_grad<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pNumFeatures, pOutFeatureGrads, pIndexs, pInFeatureGrads);
     }
 
     void computeInverseIndexs(
@@ -569,7 +573,7 @@ namespace pt_mcc
         int numBlocksPoints = pNumPoints / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumPoints % POINT_BLOCK_SIZE != 0) ? 1 : 0;
 
-        compute_inverse_indexs<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumPoints, pIndexs, pOutIndexs);
+        compute_inverse_indexs<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumPoints, pIndexs, pOutIndexs);
     }
 
     void transformIndexs(
@@ -582,6 +586,6 @@ namespace pt_mcc
         int numBlocksPoints = pNumIndexs / POINT_BLOCK_SIZE;
         numBlocksPoints += (pNumIndexs % POINT_BLOCK_SIZE != 0) ? 1 : 0;
 
-        transform_indexs<<<numBlocksPoints, POINT_BLOCK_SIZE>>>(pNumIndexs, pInStartIndexs, pInNewIndexs, pOutIndexs);
+        transform_indexs<<<numBlocksPoints, POINT_BLOCK_SIZE, 0, at::cuda::getCurrentCUDAStream()>>>(pNumIndexs, pInStartIndexs, pInNewIndexs, pOutIndexs);
     }
 }
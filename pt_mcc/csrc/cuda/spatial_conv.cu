@@ -15,6 +15,8 @@
 #include <iostream>
 #include <fstream>
 
+#include <ATen/cuda/CUDAContext.h>
+
 #include "cuda_kernel_utils.h"
 
 #define EXECUTION_BLOCK_MLP_SIZE 128
@@ -86,8 +88,8 @@ namespace pt_mcc
 
     /**
      *  Method to evaluate the MLP.
-     *  @param  pAVG                    Boolean that indicates if the results is divided by the number of neighbors or not.
-     *  @param  pScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
+     *  @tparam tAvg                    Boolean that indicates if the results is divided by the number of neighbors or not.
+     *  @tparam tScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
      *  @param  pNumPoints              Number of points.
      *  @param  pNumNeighbors           Number of neighboring points.
      *  @param  pNumFeatures            Number of input features per point.
@@ -104,12 +106,12 @@ namespace pt_mcc
      *  @param  pFeatures               List of input features.
      *  @param  pStartIndexs            List of start indices for each point.
      *  @param  pNeigbors               List neighbors of each point.
-     *  @param  pPDFs                   List of the pdf values.
+     *  @param  pPDFs                   List of the pdf values, or nullptr if the pdf is not used.
+     *  @param  pPDFStride              Stride between pdf values, 0 if a single pdf is shared by all neighbors.
      *  @param  pOutFeatures            Output parameter with the list of output features.
      */
+    template <bool tAvg, bool tScaleInv>
     __global__ void evaluateMLPKernel(
-        const bool pAvg,
-        const bool pScaleInv,
         const int pNumPoints,
         const int pNumNeighbors,
         const int pNumFeatures,
@@ -130,6 +132,7 @@ namespace pt_mcc
         const int *__restrict__ pStartIndexs,
         const int *__restrict__ pNeigbors,
         const float *__restrict__ pPDFs,
+        const int pPDFStride,
         float *__restrict__ pOutFeatures)
     {
         extern __shared__ float mlpIntermediateRes[];
@@ -158,16 +161,16 @@ namespace pt_mcc
                                         pAABBMax[currBatchId * 3] - pAABBMin[currBatchId * 3],
                                         pAABBMax[currBatchId * 3 + 1] - pAABBMin[currBatchId * 3 + 1]),
                                     pAABBMax[currBatchId * 3 + 2] - pAABBMin[currBatchId * 3 + 2]);
-            float scaledRadius = (pScaleInv) ? pRadius * maxAabbSize : pRadius;
+            float scaledRadius = (tScaleInv) ? pRadius * maxAabbSize : pRadius;
 
             float currPointCoords[3] = {
                 (pPoints[currentPointIndex * 3] - pSamples[centralPointIndex * 3]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 1] - pSamples[centralPointIndex * 3 + 1]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 2] - pSamples[centralPointIndex * 3 + 2]) / scaledRadius};
-            float currPDF = pPDFs[currentNeighborIndex];
+            float currPDF = (pPDFs != nullptr) ? pPDFs[currentNeighborIndex * pPDFStride] : 1.0f;
             int initIter = pStartIndexs[centralPointIndex];
             int endIter = (centralPointIndex < pNumPoints - 1) ? pStartIndexs[centralPointIndex + 1] : pNumNeighbors;
-            float numNeighbors = (pAvg) ? (float)(endIter - initIter) : 1.0;
+            float numNeighbors = (tAvg) ? (float)(endIter - initIter) : 1.0;
             int featureIndex = currentPointIndex * pNumFeatures;
             int outFeatureIndex = centralPointIndex * pNumOutFeatures;
 
@@ -240,8 +243,8 @@ namespace pt_mcc
 
     /**
      *  Method to evaluate the MLP.
-     *  @param  pAVG                    Boolean that indicates if the results is divided by the number of neighbors or not.
-     *  @param  pScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
+     *  @tparam tAvg                    Boolean that indicates if the results is divided by the number of neighbors or not.
+     *  @tparam tScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
      *  @param  pNumPoints              Number of points.
      *  @param  pNumNeighbors           Number of neighboring points.
      *  @param  pNumFeatures            Number of input features per point.
@@ -257,12 +260,12 @@ namespace pt_mcc
      *  @param  pFeatures               List of input features.
      *  @param  pStartIndexs            List of start indices for each point.
      *  @param  pNeigbors               List neighbors of each point.
-     *  @param  pPDFs                   List of the pdf values.
+     *  @param  pPDFs                   List of the pdf values, or nullptr if the pdf is not used.
+     *  @param  pPDFStride              Stride between pdf values, 0 if a single pdf is shared by all neighbors.
      *  @param  pOutFeatures            Output parameter with the list of output features.
      */
+    template <bool tAvg, bool tScaleInv>
     __global__ void evaluateMLPNoCombinKernel(
-        const bool pAvg,
-        const bool pScaleInv,
         const int pNumPoints,
         const int pNumNeighbors,
         const int pNumFeatures,
@@ -282,6 +285,7 @@ namespace pt_mcc
         const int *__restrict__ pStartIndexs,
         const int *__restrict__ pNeigbors,
         const float *__restrict__ pPDFs,
+        const int pPDFStride,
         float *__restrict__ pOutFeatures)
     {
         extern __shared__ float mlpIntermediateRes[];
@@ -310,16 +314,16 @@ namespace pt_mcc
                                         pAABBMax[currBatchId * 3] - pAABBMin[currBatchId * 3],
                                         pAABBMax[currBatchId * 3 + 1] - pAABBMin[currBatchId * 3 + 1]),
                                     pAABBMax[currBatchId * 3 + 2] - pAABBMin[currBatchId * 3 + 2]);
-            float scaledRadius = (pScaleInv) ? pRadius * maxAabbSize : pRadius;
+            float scaledRadius = (tScaleInv) ? pRadius * maxAabbSize : pRadius;
 
             float currPointCoords[3] = {
                 (pPoints[currentPointIndex * 3] - pSamples[centralPointIndex * 3]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 1] - pSamples[centralPointIndex * 3 + 1]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 2] - pSamples[centralPointIndex * 3 + 2]) / scaledRadius};
-            float currPDF = pPDFs[currentNeighborIndex];
+            float currPDF = (pPDFs != nullptr) ? pPDFs[currentNeighborIndex * pPDFStride] : 1.0f;
             int initIter = pStartIndexs[centralPointIndex];
             int endIter = (centralPointIndex < pNumPoints - 1) ? pStartIndexs[centralPointIndex + 1] : pNumNeighbors;
-            float numNeighbors = (pAvg) ? (float)(endIter - initIter) : 1.0;
+            float numNeighbors = (tAvg) ? (float)(endIter - initIter) : 1.0;
             int featureIndex = currentPointIndex * pNumFeatures;
             int outFeatureIndex = centralPointIndex * pNumFeatures;
 
@@ -457,8 +461,8 @@ namespace pt_mcc
 
     /**
      *  Method to evaluate the MLP.
-     *  @param  pAVG                    Boolean that indicates if the results is divided by the number of neighbors or not.
-     *  @param  pScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
+     *  @tparam tAvg                    Boolean that indicates if the results is divided by the number of neighbors or not.
+     *  @tparam tScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
      *  @param  pNumPoints              Number of points.
      *  @param  pNumNeighbors           Number of neighboring points.
      *  @param  pNumFeatures            Number of input features per point.
@@ -476,7 +480,8 @@ namespace pt_mcc
      *  @param  pOutFeaturesGrads       Gradients of the output convolutions.
      *  @param  pStartIndexs            List of start indices for each point.
      *  @param  pNeigbors               List neighbors of each point.
-     *  @param  pPDFs                   List of the pdf values.
+     *  @param  pPDFs                   List of the pdf values, or nullptr if the pdf is not used.
+     *  @param  pPDFStride              Stride between pdf values, 0 if a single pdf is shared by all neighbors.
      *  @param  pWeightsHidd1Grads      Output parameter with the list of gradients for the weights of the first hidden layer.
      *  @param  pWeightsHidd2Grads      Output parameter with the list of gradients for the weights of the second hidden layer.
      *  @param  pWeightsOutGrads        Output parameter with the list of gradients for the weights of the outpu layer.
@@ -485,9 +490,8 @@ namespace pt_mcc
      *  @param  pBiasOutGrads           Output parameter with the list of gradients for the biases of the output layer.
      *  @param  pPointsGrads            Output parameter with the list of gradients for the points.
      */
+    template <bool tAvg, bool tScaleInv>
     __global__ void computedconvj_dKernel(
-        const bool pAvg,
-        const bool pScaleInv,
         const int pNumPoints,
         const int pNumNeighbors,
         const int pNumFeatures,
@@ -509,6 +513,7 @@ namespace pt_mcc
         const int *__restrict__ pStartIndexs,
         const int *__restrict__ pNeigbors,
         const float *__restrict__ pPDFs,
+        const int pPDFStride,
         float *__restrict__ pWeightsHidd1Grads,
         float *__restrict__ pWeightsHidd2Grads,
         float *__restrict__ pWeightsOutGrads,
@@ -544,15 +549,15 @@ namespace pt_mcc
                                         pAABBMax[currBatchId * 3 + 1] - pAABBMin[currBatchId * 3 + 1]),
                                     pAABBMax[currBatchId * 3 + 2] - pAABBMin[currBatchId * 3 + 2]);
 
-            float scaledRadius = (pScaleInv) ? pRadius * maxAabbSize : pRadius;
+            float scaledRadius = (tScaleInv) ? pRadius * maxAabbSize : pRadius;
             float currPointCoords[3] = {
                 (pPoints[currentPointIndex * 3] - pSamples[centralPointIndex * 3]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 1] - pSamples[centralPointIndex * 3 + 1]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 2] - pSamples[centralPointIndex * 3 + 2]) / scaledRadius};
-            float currPDF = pPDFs[currentNeighborIndex];
+            float currPDF = (pPDFs != nullptr) ? pPDFs[currentNeighborIndex * pPDFStride] : 1.0f;
             int initIter = pStartIndexs[centralPointIndex];
             int endIter = (centralPointIndex < pNumPoints - 1) ? pStartIndexs[centralPointIndex + 1] : pNumNeighbors;
-            float numNeighbors = (pAvg) ? (float)(endIter - initIter) : 1.0;
+            float numNeighbors = (tAvg) ? (float)(endIter - initIter) : 1.0;
             int featureIndex = currentPointIndex * pNumFeatures;
             int outFeatureIndex = centralPointIndex * pNumOutFeatures;
 
@@ -692,8 +697,8 @@ namespace pt_mcc
 
     /**
      *  Method to evaluate the MLP.
-     *  @param  pAVG                    Boolean that indicates if the results is divided by the number of neighbors or not.
-     *  @param  pScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
+     *  @tparam tAvg                    Boolean that indicates if the results is divided by the number of neighbors or not.
+     *  @tparam tScaleInv               Boolean that indicates if the radius is defined relative to the bounding box.
      *  @param  pNumPoints              Number of points.
      *  @param  pNumNeighbors           Number of neighboring points.
      *  @param  pNumFeatures            Number of input features per point.
@@ -710,7 +715,8 @@ namespace pt_mcc
      *  @param  pOutFeaturesGrads       Gradients of the output convolutions.
      *  @param  pStartIndexs            List of start indices for each point.
      *  @param  pNeigbors               List neighbors of each point.
-     *  @param  pPDFs                   List of the pdf values.
+     *  @param  pPDFs                   List of the pdf values, or nullptr if the pdf is not used.
+     *  @param  pPDFStride              Stride between pdf values, 0 if a single pdf is shared by all neighbors.
      *  @param  pWeightsHidd1Grads      Output parameter with the list of gradients for the weights of the first hidden layer.
      *  @param  pWeightsHidd2Grads      Output parameter with the list of gradients for the weights of the second hidden layer.
      *  @param  pWeightsOutGrads        Output parameter with the list of gradients for the weights of the outpu layer.
@@ -719,9 +725,8 @@ namespace pt_mcc
      *  @param  pBiasOutGrads           Output parameter with the list of gradients for the biases of the output layer.
      *  @param  pPointsGrads            Output parameter with the list of gradients for the points.
      */
+    template <bool tAvg, bool tScaleInv>
     __global__ void computedconvj_dNoCombinKernel(
-        const bool pAvg,
-        const bool pScaleInv,
         const int pNumPoints,
         const int pNumNeighbors,
         const int pNumFeatures,
@@ -742,6 +747,7 @@ namespace pt_mcc
         const int *__restrict__ pStartIndexs,
         const int *__restrict__ pNeigbors,
         const float *__restrict__ pPDFs,
+        const int pPDFStride,
         float *__restrict__ pWeightsHidd1Grads,
         float *__restrict__ pWeightsHidd2Grads,
         float *__restrict__ pWeightsOutGrads,
@@ -776,16 +782,16 @@ namespace pt_mcc
                                         pAABBMax[currBatchId * 3] - pAABBMin[currBatchId * 3],
                                         pAABBMax[currBatchId * 3 + 1] - pAABBMin[currBatchId * 3 + 1]),
                                     pAABBMax[currBatchId * 3 + 2] - pAABBMin[currBatchId * 3 + 2]);
-            float scaledRadius = (pScaleInv) ? pRadius * maxAabbSize : pRadius;
+            float scaledRadius = (tScaleInv) ? pRadius * maxAabbSize : pRadius;
 
             float currPointCoords[3] = {
                 (pPoints[currentPointIndex * 3] - pSamples[centralPointIndex * 3]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 1] - pSamples[centralPointIndex * 3 + 1]) / scaledRadius,
                 (pPoints[currentPointIndex * 3 + 2] - pSamples[centralPointIndex * 3 + 2]) / scaledRadius};
-            float currPDF = pPDFs[currentNeighborIndex];
+            float currPDF = (pPDFs != nullptr) ? pPDFs[currentNeighborIndex * pPDFStride] : 1.0f;
             int initIter = pStartIndexs[centralPointIndex];
             int endIter = (centralPointIndex < pNumPoints - 1) ? pStartIndexs[centralPointIndex + 1] : pNumNeighbors;
-            float numNeighbors = (pAvg) ? (float)(endIter - initIter) : 1.0;
+            float numNeighbors = (tAvg) ? (float)(endIter - initIter) : 1.0;
             int featureIndex = currentPointIndex * pNumFeatures;
             int outFeatureIndex = centralPointIndex * pNumFeatures;
 
@@ -807,6 +813,23 @@ namespace pt_mcc
 
     ////////////////////////////////////////////////////////////////////////////////// CPU
 
+    /**
+     *  Macro to launch a kernel specialized for the values of the avg and scale
+     *  invariant flags, which removes the branches on them from the kernel.
+     */
+#define LAUNCH_CONV_KERNEL(kernel, grid, block, sharedMem, avg, scaleInv, ...)                               \
+    do                                                                                                       \
+    {                                                                                                        \
+        if (avg && scaleInv)                                                                                 \
+            kernel<true, true><<<grid, block, sharedMem, at::cuda::getCurrentCUDAStream()>>>(__VA_ARGS__);   \
+        else if (avg)                                                                                        \
+            kernel<true, false><<<grid, block, sharedMem, at::cuda::getCurrentCUDAStream()>>>(__VA_ARGS__);  \
+        else if (scaleInv)                                                                                   \
+            kernel<false, true><<<grid, block, sharedMem, at::cuda::getCurrentCUDAStream()>>>(__VA_ARGS__);  \
+        else                                                                                                 \
+            kernel<false, false><<<grid, block, sharedMem, at::cuda::getCurrentCUDAStream()>>>(__VA_ARGS__); \
+    } while (0)
+
     void spatialConvCPU(
         bool pAvg,
         bool pScaleInv,
@@ -820,6 +843,7 @@ namespace pt_mcc
         const int *pBatchIds,
         const float *pInFeatures,
         const float *pPDFs,
+        int pPDFStride,
         const float *pSamples,
         const int *pStartIndexs,
         const int *pPackedNeighs,
@@ -843,7 +867,7 @@ namespace pt_mcc
         // Evaluate MLP.
         if (pCombin)
         {
-            cudaMemset(pOutFeatues, 0, pNumOutFeatures * pNumSamples * sizeof(float));
+            cudaMemsetAsync(pOutFeatues, 0, pNumOutFeatures * pNumSamples * sizeof(float), at::cuda::getCurrentCUDAStream());
 
             int numBlocksPerPoint = (pNumOutFeatures * pNumInFeatures) / BLOCK_MLP_SIZE;
             numBlocksPerPoint += ((pNumOutFeatures * pNumInFeatures) % BLOCK_MLP_SIZE != 0) ? 1 : 0;
@@ -853,16 +877,16 @@ namespace pt_mcc
                     (unsigned long long int)BLOCK_MLP_SIZE,
                 EXECUTION_BLOCK_MLP_SIZE);
 
-            evaluateMLPKernel<<<gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 2 * sizeof(float)>>>(
-                pAvg, pScaleInv, pNumSamples, pNumNeighbors, pNumInFeatures, pNumOutFeatures, pRadius, pAABBMin, pAABBMax,
+            LAUNCH_CONV_KERNEL(evaluateMLPKernel, gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 2 * sizeof(float), pAvg, pScaleInv,
+                pNumSamples, pNumNeighbors, pNumInFeatures, pNumOutFeatures, pRadius, pAABBMin, pAABBMax,
                 pWeights1, pWeights2, pWeightsOut, pBiases1, pBiases2, pBiasesOut, pSamples, pInPoints, pBatchIds,
-                pInFeatures, pStartIndexs, pPackedNeighs, pPDFs, pOutFeatues);
+                pInFeatures, pStartIndexs, pPackedNeighs, pPDFs, pPDFStride, pOutFeatues);
 
             gpuErrchk(cudaPeekAtLastError());
         }
         else
         {
-            cudaMemset(pOutFeatues, 0, pNumInFeatures * pNumSamples * sizeof(float));
+            cudaMemsetAsync(pOutFeatues, 0, pNumInFeatures * pNumSamples * sizeof(float), at::cuda::getCurrentCUDAStream());
 
             int numBlocksPerPoint = (pNumInFeatures) / BLOCK_MLP_SIZE;
             numBlocksPerPoint += ((pNumInFeatures) % BLOCK_MLP_SIZE != 0) ? 1 : 0;
@@ -872,10 +896,10 @@ namespace pt_mcc
                     (unsigned long long int)BLOCK_MLP_SIZE,
                 EXECUTION_BLOCK_MLP_SIZE);
 
-            evaluateMLPNoCombinKernel<<<gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 2 * sizeof(float)>>>(
-                pAvg, pScaleInv, pNumSamples, pNumNeighbors, pNumInFeatures, pRadius, pAABBMin, pAABBMax,
+            LAUNCH_CONV_KERNEL(evaluateMLPNoCombinKernel, gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 2 * sizeof(float), pAvg, pScaleInv,
+                pNumSamples, pNumNeighbors, pNumInFeatures, pRadius, pAABBMin, pAABBMax,
                 pWeights1, pWeights2, pWeightsOut, pBiases1, pBiases2, pBiasesOut, pSamples, pInPoints, pBatchIds,
-                pInFeatures, pStartIndexs, pPackedNeighs, pPDFs, pOutFeatues);
+                pInFeatures, pStartIndexs, pPackedNeighs, pPDFs, pPDFStride, pOutFeatues);
 
             gpuErrchk(cudaPeekAtLastError());
         }
@@ -903,6 +927,7 @@ namespace pt_mcc
         const int *pBatchIds,
         const float *pInFeatures,
         const float *pPDFs,
+        int pPDFStride,
         const float *pSamples,
         const int *pStartIndexs,
         const int *pPackedNeighs,
@@ -936,20 +961,20 @@ namespace pt_mcc
             int numBlocksPerPoint = (pNumOutFeatures * pNumInFeatures) / BLOCK_MLP_SIZE;
             numBlocksPerPoint += ((pNumOutFeatures * pNumInFeatures) % BLOCK_MLP_SIZE != 0) ? 1 : 0;
 
-            cudaMemset(pWeights1Grads, 0, sizeof(float) * 3 * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pWeight2Grads, 0, sizeof(float) * BLOCK_MLP_SIZE * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pWeightOutGrads, 0, sizeof(float) * (pNumOutFeatures * pNumInFeatures) * BLOCK_MLP_SIZE);
-            cudaMemset(pBiases1Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pBiases2Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pBiasesOutGrads, 0, sizeof(float) * (pNumOutFeatures * pNumInFeatures));
-            cudaMemset(pOutFeatureGrads, 0, sizeof(float) * pNumPoints * pNumInFeatures);
+            cudaMemsetAsync(pWeights1Grads, 0, sizeof(float) * 3 * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pWeight2Grads, 0, sizeof(float) * BLOCK_MLP_SIZE * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pWeightOutGrads, 0, sizeof(float) * (pNumOutFeatures * pNumInFeatures) * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pBiases1Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pBiases2Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pBiasesOutGrads, 0, sizeof(float) * (pNumOutFeatures * pNumInFeatures), at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pOutFeatureGrads, 0, sizeof(float) * pNumPoints * pNumInFeatures, at::cuda::getCurrentCUDAStream());
 
             dim3 gridDimension = computeBlockGrid(pNumNeighbors * numBlocksPerPoint * BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE);
 
-            computedconvj_dKernel<<<gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 4 * sizeof(float)>>>(
-                pAvg, pScaleInv, pNumSamples, pNumNeighbors, pNumInFeatures,
+            LAUNCH_CONV_KERNEL(computedconvj_dKernel, gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 4 * sizeof(float), pAvg, pScaleInv,
+                pNumSamples, pNumNeighbors, pNumInFeatures,
                 pNumOutFeatures, pRadius, pAABBMin, pAABBMax, pWeights1, pWeights2, pWeightsOut, pBiases1, pBiases2, pBiasesOut,
-                pSamples, pInPoints, pBatchIds, pInFeatures, pInOutFeatueGrads, pStartIndexs, pPackedNeighs, pPDFs, pWeights1Grads,
+                pSamples, pInPoints, pBatchIds, pInFeatures, pInOutFeatueGrads, pStartIndexs, pPackedNeighs, pPDFs, pPDFStride, pWeights1Grads,
                 pWeight2Grads, pWeightOutGrads, pBiases1Grads, pBiases2Grads, pBiasesOutGrads, pOutFeatureGrads);
 
             gpuErrchk(cudaGetLastError());
@@ -959,20 +984,20 @@ namespace pt_mcc
             int numBlocksPerPoint = (pNumInFeatures) / BLOCK_MLP_SIZE;
             numBlocksPerPoint += ((pNumInFeatures) % BLOCK_MLP_SIZE != 0) ? 1 : 0;
 
-            cudaMemset(pWeights1Grads, 0, sizeof(float) * 3 * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pWeight2Grads, 0, sizeof(float) * BLOCK_MLP_SIZE * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pWeightOutGrads, 0, sizeof(float) * pNumInFeatures * BLOCK_MLP_SIZE);
-            cudaMemset(pBiases1Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pBiases2Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE);
-            cudaMemset(pBiasesOutGrads, 0, sizeof(float) * pNumInFeatures);
-            cudaMemset(pOutFeatureGrads, 0, sizeof(float) * pNumPoints * pNumInFeatures);
+            cudaMemsetAsync(pWeights1Grads, 0, sizeof(float) * 3 * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pWeight2Grads, 0, sizeof(float) * BLOCK_MLP_SIZE * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pWeightOutGrads, 0, sizeof(float) * pNumInFeatures * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pBiases1Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pBiases2Grads, 0, sizeof(float) * numBlocksPerPoint * BLOCK_MLP_SIZE, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pBiasesOutGrads, 0, sizeof(float) * pNumInFeatures, at::cuda::getCurrentCUDAStream());
+            cudaMemsetAsync(pOutFeatureGrads, 0, sizeof(float) * pNumPoints * pNumInFeatures, at::cuda::getCurrentCUDAStream());
 
             dim3 gridDimension = computeBlockGrid(pNumNeighbors * numBlocksPerPoint * BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE);
 
-            computedconvj_dNoCombinKernel<<<gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 4 * sizeof(float)>>>(
-                pAvg, pScaleInv, pNumSamples, pNumNeighbors, pNumInFeatures,
+            LAUNCH_CONV_KERNEL(computedconvj_dNoCombinKernel, gridDimension, EXECUTION_BLOCK_MLP_SIZE, EXECUTION_BLOCK_MLP_SIZE * 4 * sizeof(float), pAvg, pScaleInv,
+                pNumSamples, pNumNeighbors, pNumInFeatures,
                 pRadius, pAABBMin, pAABBMax, pWeights1, pWeights2, pWeightsOut, pBiases1, pBiases2, pBiasesOut,
-                pSamples, pInPoints, pBatchIds, pInFeatures, pInOutFeatueGrads, pStartIndexs, pPackedNeighs, pPDFs, pWeights1Grads,
+                pSamples, pInPoints, pBatchIds, pInFeatures, pInOutFeatueGrads, pStartIndexs, pPackedNeighs, pPDFs, pPDFStride, pWeights1Grads,
                 pWeight2Grads, pWeightOutGrads, pBiases1Grads, pBiases2Grads, pBiasesOutGrads, pOutFeatureGrads);
 
             gpuErrchk(cudaPeekAtLastError());
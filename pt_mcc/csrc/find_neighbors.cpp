@@ -1,4 +1,5 @@
 #include <torch/extension.h>
+#include "tensor_checks.h"
 #include <cuda_runtime.h>
 
 namespace pt_mcc
@@ -55,9 +56,9 @@ namespace pt_mcc
         TORCH_CHECK(batch_size > 0, "batch size must be positive")
 
         TORCH_CHECK(points.dim() == 2 && points.size(1) == 3, "points should have dimensions (N, 3)");
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(0) == points.size(0) && batch_ids.size(1) == 1, "batch_ids should have dimensions (N, 1)");
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, points.size(0)), "batch_ids should be contiguous int32 with dimensions (N) or (N, 1)");
         TORCH_CHECK(points2.dim() == 2 && points2.size(1) == 3, "points2 should have dimensions (M, 3)");
-        TORCH_CHECK(cell_indices.dim() == 5 && cell_indices.size(0) == batch_size, "cell_indices should have dimensions (B, numCells, ...)");
+        TORCH_CHECK(cell_indices.dim() == 5 && cell_indices.size(0) == batch_size && is_int32_indices(cell_indices), "cell_indices should be contiguous int32 with dimensions (B, numCells, ...)");
         TORCH_CHECK(aabb_min.dim() == 2 && aabb_min.size(0) == batch_size && aabb_min.size(1) == 3, "aabb_min should have dimensions (B, 3)");
         TORCH_CHECK(aabb_max.dim() == 2 && aabb_max.size(0) == batch_size && aabb_max.size(1) == 3, "aabb_max should have dimensions (B, 3)");
 
@@ -0,0 +1,203 @@
+/////////////////////////////////////////////////////////////////////////////
+/// \file point_hierarchy.cpp
+///
+/// \brief C++ operation definitions to compute the levels of a point hierarchy.
+///
+/// \copyright Copyright (c) 2018 Visual Computing group of Ulm University,
+///            Germany. See the LICENSE file at the top-level directory of
+///            this distribution.
+///
+/// \author pedro hermosilla (pedro-1.hermosilla-casajus@uni-ulm.de)
+/////////////////////////////////////////////////////////////////////////////
+
+#include <torch/extension.h>
+#include "tensor_checks.h"
+#include <tuple>
+#include <vector>
+
+namespace pt_mcc
+{
+    int determineNumCells(
+        const bool scaleInv,
+        const int64_t batchSize,
+        const double cellSize,
+        const float *aabbMin,
+        const float *aabbMax);
+
+    void computeAuxiliarBuffersSize(
+        const int64_t batchSize,
+        const int numCells,
+        int *bufferSize1,
+        int *bufferSize2,
+        int *bufferSize3);
+
+    void sortPointsStep1GPUKernel(
+        const int pNumPoints,
+        const int64_t pBatchSize,
+        const int pNumCells,
+        const float *pAABBMin,
+        const float *pAABBMax,
+        const float *pPoints,
+        const int *pBatchIds,
+        int *pAuxBuffCounters,
+        int *pAuxBuffOffsets,
+        int *pAuxBuffOffsets2,
+        int *pKeys,
+        int *pNewIndexs);
+
+    void sortPointsStep2GPUKernel(
+        const int pNumPoints,
+        const int64_t pBatchSize,
+        const int pNumFeatures,
+        const int pNumCells,
+        const float *pPoints,
+        const int *pBatchIds,
+        const float *pFeatures,
+        const int *pKeys,
+        const int *pNewIndexs,
+        int *pAuxBuffer,
+        float *pOutPoints,
+        int *pOutBatchIds,
+        float *pOutFeatures,
+        int *pOutCellIndexs);
+
+    std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> poisson_sampling(
+        const torch::Tensor &points,
+        const torch::Tensor &batch_ids,
+        const torch::Tensor &cell_indices,
+        const torch::Tensor &aabb_min,
+        const torch::Tensor &aabb_max,
+        double radius,
+        int64_t batch_size,
+        bool scale_inv);
+
+    torch::Tensor transform_indices(
+        torch::Tensor start_indices,
+        torch::Tensor new_indices);
+
+    /**
+     * Compute the next level of a point hierarchy: distribute the points into a regular grid
+     * with the cell size equal to the radius, select a subset of them with poisson disk sampling,
+     * and map the selected points to their index in the input point cloud. It is equivalent to
+     * calling sort_points_step1, sort_points_step2, poisson_sampling and transform_indices, but
+     * the sorted points are kept internal and the number of cells is only computed once. The
+     * features of the selected points can be gathered from the input features with the
+     * returned indices.
+     */
+    std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> build_hierarchy_level(
+        const torch::Tensor &points,
+        const torch::Tensor &batch_ids,
+        const torch::Tensor &aabb_min,
+        const torch::Tensor &aabb_max,
+        double radius,
+        int64_t batch_size,
+        bool scale_inv)
+    {
+        TORCH_CHECK(radius > 0.0, "radius must be positive")
+        TORCH_CHECK(batch_size > 0, "batch size must be positive")
+        TORCH_CHECK(points.dim() == 2 && points.size(1) == 3 && points.is_contiguous(), "points should be contiguous with dimensions (N, 3)");
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, points.size(0)), "batch_ids should be contiguous int32 with dimensions (N) or (N, 1)");
+        TORCH_CHECK(aabb_min.dim() == 2 && aabb_min.size(0) == batch_size && aabb_min.size(1) == 3, "aabb_min should have dimensions (B, 3)");
+        TORCH_CHECK(aabb_max.dim() == 2 && aabb_max.size(0) == batch_size && aabb_max.size(1) == 3, "aabb_max should have dimensions (B, 3)");
+        TORCH_CHECK(points.is_cuda() && batch_ids.is_cuda(), "Input tensors must be on CUDA device");
+
+        int num_points = points.size(0);
+        const float *aabb_min_ptr = aabb_min.data_ptr<float>();
+        const float *aabb_max_ptr = aabb_max.data_ptr<float>();
+        auto int_options = batch_ids.options().dtype(torch::kInt32);
+
+        // Determine the number of cells of the grid.
+        int num_cells = determineNumCells(scale_inv, batch_size, radius, aabb_min_ptr, aabb_max_ptr);
+
+        // Compute the cell of each point and its index in the sorted list.
+        auto keys = torch::empty({num_points}, int_options);
+        auto new_indices = torch::empty({num_points}, int_options);
+
+        int buffer_size1, buffer_size2, buffer_size3;
+        computeAuxiliarBuffersSize(batch_size, num_cells, &buffer_size1, &buffer_size2, &buffer_size3);
+        // The auxiliar buffers are cleared by the kernel launcher.
+        auto aux_buffer_counters = torch::empty({buffer_size1}, int_options);
+        auto aux_buffer_offsets = torch::empty({buffer_size2}, int_options);
+        auto aux_buffer_offsets2 = torch::empty({buffer_size3}, int_options);
+
+        sortPointsStep1GPUKernel(
+            num_points, batch_size, num_cells,
+            aabb_min_ptr, aabb_max_ptr,
+            points.data_ptr<float>(), batch_ids.data_ptr<int>(),
+            aux_buffer_counters.data_ptr<int>(), aux_buffer_offsets.data_ptr<int>(),
+            aux_buffer_offsets2.data_ptr<int>(), keys.data_ptr<int>(), new_indices.data_ptr<int>());
+
+        // Sort the points into the grid. The features are not moved.
+        auto sort_points = torch::empty_like(points);
+        auto sort_batch_ids = torch::empty_like(batch_ids);
+        auto cell_indices = torch::empty({batch_size, num_cells, num_cells, num_cells, 2}, int_options);
+        auto temp_buffer = torch::empty({num_points}, int_options);
+
+        sortPointsStep2GPUKernel(
+            num_points, batch_size, 0, num_cells,
+            points.data_ptr<float>(), batch_ids.data_ptr<int>(), nullptr,
+            keys.data_ptr<int>(), new_indices.data_ptr<int>(), temp_buffer.data_ptr<int>(),
+            sort_points.data_ptr<float>(), sort_batch_ids.data_ptr<int>(), nullptr,
+            cell_indices.data_ptr<int>());
+
+        // Select the points of the next level and map them to the input point cloud.
+        torch::Tensor sampled_points, sampled_batch_ids, sampled_indices;
+        std::tie(sampled_points, sampled_batch_ids, sampled_indices) = poisson_sampling(
+            sort_points, sort_batch_ids, cell_indices, aabb_min, aabb_max, radius, batch_size, scale_inv);
+        torch::Tensor input_indices = transform_indices(sampled_indices, new_indices);
+
+        return std::make_tuple(sampled_points, sampled_batch_ids, input_indices);
+    }
+
+    /**
+     * Compute all the levels of a point hierarchy, one per radius. Each level is sampled from
+     * the points of the previous one, so the levels are computed in sequence, but the whole
+     * hierarchy is built with a single call to the operation. The returned indices of each
+     * level refer to the points of the previous level.
+     */
+    std::tuple<std::vector<torch::Tensor>, std::vector<torch::Tensor>, std::vector<torch::Tensor>> build_hierarchy(
+        const torch::Tensor &points,
+        const torch::Tensor &batch_ids,
+        const torch::Tensor &aabb_min,
+        const torch::Tensor &aabb_max,
+        at::ArrayRef<double> radii,
+        int64_t batch_size,
+        bool scale_inv)
+    {
+        std::vector<torch::Tensor> level_points, level_batch_ids, level_indices;
+        level_points.reserve(radii.size());
+        level_batch_ids.reserve(radii.size());
+        level_indices.reserve(radii.size());
+
+        torch::Tensor curr_points = points;
+        torch::Tensor curr_batch_ids = batch_ids;
+        for (double radius : radii)
+        {
+            torch::Tensor sampled_points, sampled_batch_ids, input_indices;
+            std::tie(sampled_points, sampled_batch_ids, input_indices) = build_hierarchy_level(
+                curr_points, curr_batch_ids, aabb_min, aabb_max, radius, batch_size, scale_inv);
+
+            level_points.push_back(sampled_points);
+            level_batch_ids.push_back(sampled_batch_ids);
+            level_indices.push_back(input_indices);
+
+            curr_points = sampled_points;
+            curr_batch_ids = sampled_batch_ids;
+        }
+
+        return std::make_tuple(level_points, level_batch_ids, level_indices);
+    }
+
+    void register_point_hierarchy(torch::Library &m)
+    {
+        m.def("build_hierarchy_level(Tensor points, Tensor batch_ids, Tensor aabb_min, Tensor aabb_max, float radius, int batch_size, bool scale_inv) -> (Tensor, Tensor, Tensor)");
+        m.def("build_hierarchy(Tensor points, Tensor batch_ids, Tensor aabb_min, Tensor aabb_max, float[] radii, int batch_size, bool scale_inv) -> (Tensor[], Tensor[], Tensor[])");
+    }
+
+    // Register CUDA implementations
+    TORCH_LIBRARY_IMPL(pt_mcc, CUDA, m)
+    {
+        m.impl("build_hierarchy_level", &build_hierarchy_level);
+        m.impl("build_hierarchy", &build_hierarchy);
+    }
+}
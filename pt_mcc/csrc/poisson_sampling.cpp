@@ -1,4 +1,5 @@
 #include <torch/extension.h>
+#include "tensor_checks.h"
 #include <cuda_runtime.h>
 
 namespace pt_mcc
@@ -37,14 +38,6 @@ namespace pt_mcc
         const float *pInFeature,
         float *pOutSelFeatures);
 
-    void getFeaturesSampledPointsGradients(
-        int pNumPoints,
-        int pNumFeatures,
-        int pNumSampledPoints,
-        const int *pInPointsIndexs,
-        const float *pInOutFeatureGrad,
-        float *pOutInFeaturesGradients);
-
     // Poisson sampling function
     std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> poisson_sampling(
         const torch::Tensor &points,
@@ -61,7 +54,7 @@ namespace pt_mcc
         TORCH_CHECK(batch_size > 0, "batch size must be positive")
 
         TORCH_CHECK(points.dim() == 2 && points.size(1) == 3, "points should have dimensions (N, 3)");
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(0) == points.size(0) && batch_ids.size(1) == 1, "batch_ids should have dimensions (N, 1)");
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, points.size(0)), "batch_ids should be contiguous int32 with dimensions (N) or (N, 1)");
         TORCH_CHECK(cell_indices.dim() == 5 && cell_indices.size(0) == batch_size, "cell_indices should have dimensions (B, numCells, ...)");
         TORCH_CHECK(aabb_min.dim() == 2 && aabb_min.size(0) == batch_size && aabb_min.size(1) == 3, "aabb_min should have dimensions (B, 3)");
         TORCH_CHECK(aabb_max.dim() == 2 && aabb_max.size(0) == batch_size && aabb_max.size(1) == 3, "aabb_max should have dimensions (B, 3)");
@@ -84,7 +77,9 @@ namespace pt_mcc
             tmp_used_bool.data_ptr<bool>());
 
         torch::Tensor out_pts = torch::empty({num_sel_samples, 3}, points.options());
-        torch::Tensor out_batchs = torch::empty({num_sel_samples, 1}, batch_ids.options());
+        // The sampled batch ids have the same rank as the input batch ids
+        torch::Tensor out_batchs = batch_ids.dim() == 1 ? torch::empty({num_sel_samples}, batch_ids.options())
+                                                        : torch::empty({num_sel_samples, 1}, batch_ids.options());
         torch::Tensor out_indices = torch::empty({num_sel_samples}, batch_ids.options());
 
         copyPoints(tmp_pts.data_ptr<float>(), tmp_batchs.data_ptr<int>(), tmp_indexs.data_ptr<int>(),
@@ -97,7 +92,7 @@ namespace pt_mcc
     // Feature sampling function
     torch::Tensor get_sampled_features(const torch::Tensor &pts_indices, const torch::Tensor &features)
     {
-        TORCH_CHECK(pts_indices.dim() == 1, "point indices should have dimensions (N)");
+        TORCH_CHECK(pts_indices.dim() == 1 && is_int32_indices(pts_indices), "point indices should be int32 with dimensions (N)");
         TORCH_CHECK(features.dim() == 2, "features should have dimensions (N, m)");
         int num_sampled_points = pts_indices.size(0);
         int num_points = features.size(0);
@@ -115,18 +110,17 @@ namespace pt_mcc
     // Gradient function for feature sampling
     torch::Tensor get_sampled_features_grad(const torch::Tensor &pts_indices, const torch::Tensor &features, const torch::Tensor &sampled_features_grad)
     {
-        TORCH_CHECK(pts_indices.dim() == 1, "point indices should have dimensions (N)");
+        TORCH_CHECK(pts_indices.dim() == 1 && is_int32_indices(pts_indices), "point indices should be int32 with dimensions (N)");
         TORCH_CHECK(features.dim() == 2, "features should have dimensions (N, m)");
         int num_sampled_points = pts_indices.size(0);
         int num_points = features.size(0);
         int num_features = features.size(1);
 
         TORCH_CHECK(sampled_features_grad.dim() == 2 && sampled_features_grad.size(0) == num_sampled_points && sampled_features_grad.size(1) == num_features, "features should have dimensions (N, m)");
-        torch::Tensor out_features_grad = torch::empty({num_points, num_features}, features.options());
 
-        getFeaturesSampledPointsGradients(num_points, num_features, num_sampled_points,
-                                          pts_indices.data_ptr<int>(), sampled_features_grad.data_ptr<float>(),
-                                          out_features_grad.data_ptr<float>());
+        // A point can be sampled more than once, so the gradients are accumulated.
+        torch::Tensor out_features_grad = torch::zeros({num_points, num_features}, features.options());
+        out_features_grad.index_add_(0, pts_indices, sampled_features_grad);
 
         return out_features_grad;
     }
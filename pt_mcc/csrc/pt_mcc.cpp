@@ -10,6 +10,7 @@ namespace pt_mcc
     void register_sort(torch::Library &m);
     void register_spatial_connv(torch::Library &m);
     void register_muladd(torch::Library &m);
+    void register_point_hierarchy(torch::Library &m);
 }
 
 // Registers _C as a Python extension module.
@@ -27,4 +28,5 @@ TORCH_LIBRARY(pt_mcc, m)
     pt_mcc::register_sort(m);
     pt_mcc::register_spatial_connv(m);
     pt_mcc::register_muladd(m);
+    pt_mcc::register_point_hierarchy(m);
 }
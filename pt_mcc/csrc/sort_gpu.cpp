@@ -1,4 +1,5 @@
 #include <torch/extension.h>
+#include "tensor_checks.h"
 
 namespace pt_mcc
 {
@@ -94,7 +95,7 @@ namespace pt_mcc
         const bool scale_inv)
     {
         TORCH_CHECK(points.dim() == 2 && points.size(1) == 3, "Points tensor must have shape (N, 3)");
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(0) == points.size(0) && batch_ids.size(1) == 1, "Batch IDs tensor must have shape (N)");
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, points.size(0)), "Batch IDs tensor must be contiguous int32 with shape (N) or (N, 1)");
         TORCH_CHECK(aabb_min.dim() == 2 && aabb_min.size(0) == batch_size && aabb_min.size(1) == 3, "AABB min tensor must have shape (batch_size, 3)");
         TORCH_CHECK(aabb_max.dim() == 2 && aabb_max.size(0) == batch_size && aabb_max.size(1) == 3, "AABB max tensor must have shape (batch_size, 3)");
 
@@ -150,15 +151,15 @@ namespace pt_mcc
         TORCH_CHECK(points.dim() == 2 && points.size(1) == 3,
                     "Expected points to have shape (num_points, 3)");
         int num_points = points.size(0);
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(0) == num_points && batch_ids.size(1) == 1,
-                    "Expected batch_ids to have shape (num_points, 1)");
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, num_points),
+                    "Expected batch_ids to be contiguous int32 with shape (num_points) or (num_points, 1)");
         TORCH_CHECK(features.dim() == 2 && features.size(1) > 0,
                     "Expected features to have shape (num_points, num_features)");
         int num_features = features.size(1);
-        TORCH_CHECK(keys.dim() == 1 && keys.size(0) == num_points,
-                    "Expected keys to have shape (num_points)");
-        TORCH_CHECK(new_indices.dim() == 1 && new_indices.size(0) == num_points,
-                    "Expected new_indices to have shape (num_points)");
+        TORCH_CHECK(keys.dim() == 1 && keys.size(0) == num_points && is_int32_indices(keys),
+                    "Expected keys to be contiguous int32 with shape (num_points)");
+        TORCH_CHECK(new_indices.dim() == 1 && new_indices.size(0) == num_points && is_int32_indices(new_indices),
+                    "Expected new_indices to be contiguous int32 with shape (num_points)");
         TORCH_CHECK(aabb_min.dim() == 2 && aabb_min.size(0) == batch_size && aabb_min.size(1) == 3,
                     "Expected aabb_min to have shape (batch_size, 3)");
         TORCH_CHECK(aabb_max.dim() == 2 && aabb_max.size(0) == batch_size && aabb_max.size(1) == 3,
@@ -207,7 +208,7 @@ namespace pt_mcc
         const torch::Tensor &output_feature_grad)
     {
         // Check the dimensions and types
-        TORCH_CHECK(new_indices.dim() == 1, "Expected new_indices to be 1D (num_points)");
+        TORCH_CHECK(new_indices.dim() == 1 && is_int32_indices(new_indices), "Expected new_indices to be 1D int32 (num_points)");
         TORCH_CHECK(output_grad.dim() == 2 && output_grad.size(1) >= 3, "Expected output_grad to be 2D with at least 3 components per point");
         TORCH_CHECK(output_feature_grad.dim() == 2 && output_feature_grad.size(1) > 0, "Expected output_feature_grad to be 2D with at least one component per point");
 
@@ -244,13 +245,14 @@ namespace pt_mcc
         return std::make_tuple(out_input_grads, out_input_feature_grads);
     }
 
-    torch::Tensor sort_features(
-        torch::Tensor features,
-        torch::Tensor new_indices)
+    torch::Tensor &sort_features_out(
+        const torch::Tensor &features,
+        const torch::Tensor &new_indices,
+        torch::Tensor &out_feature)
     {
 
         // Check input shapes
-        TORCH_CHECK(new_indices.dim() == 1, "sort_features expects indices with shape (num_points)");
+        TORCH_CHECK(new_indices.dim() == 1 && is_int32_indices(new_indices), "sort_features expects int32 indices with shape (num_points)");
         int num_points = new_indices.size(0);
 
         TORCH_CHECK(features.dim() == 2, "sort_features expects gradients of features with shape (num_points, num_features)");
@@ -259,8 +261,10 @@ namespace pt_mcc
         TORCH_CHECK(features.device().is_cuda(), "Input tensors must be on CUDA device");
         TORCH_CHECK(new_indices.device().is_cuda(), "Input tensors must be on CUDA device");
 
-        // Allocate output tensor
-        auto out_feature = torch::empty_like(features);
+        // Check the output tensor
+        TORCH_CHECK(out_feature.sizes() == features.sizes() && out_feature.dtype() == features.dtype() && out_feature.is_contiguous(),
+                    "sort_features expects a contiguous output tensor with the shape and type of the features");
+        TORCH_CHECK(out_feature.device() == features.device(), "Output tensor must be on the device of the features");
 
         // Call the kernel function
         sortFeaturesBackGrad(
@@ -273,12 +277,22 @@ namespace pt_mcc
         return out_feature;
     }
 
+    torch::Tensor sort_features(
+        torch::Tensor features,
+        torch::Tensor new_indices)
+    {
+        // Allocate output tensor
+        auto out_feature = torch::empty_like(features, at::MemoryFormat::Contiguous);
+        sort_features_out(features, new_indices, out_feature);
+        return out_feature;
+    }
+
     torch::Tensor sort_features_back(
         torch::Tensor features,
         torch::Tensor new_indices)
     {
         // Check input shapes
-        TORCH_CHECK(new_indices.dim() == 1, "sort_features_back expects indices with shape (num_points)");
+        TORCH_CHECK(new_indices.dim() == 1 && is_int32_indices(new_indices), "sort_features_back expects int32 indices with shape (num_points)");
         int num_points = new_indices.size(0);
 
         TORCH_CHECK(features.dim() == 2, "sort_features_back expects features with shape (num_points, num_features)");
@@ -307,7 +321,7 @@ namespace pt_mcc
     {
 
         // Check input shapes
-        TORCH_CHECK(new_indices.dim() == 1, "sort_features_back_grad expects indices with shape (num_points)");
+        TORCH_CHECK(new_indices.dim() == 1 && is_int32_indices(new_indices), "sort_features_back_grad expects int32 indices with shape (num_points)");
         int num_points = new_indices.size(0);
 
         TORCH_CHECK(output_feature_grad.dim() == 2, "sort_features_back_grad expects gradients of features with shape (num_points, num_features)");
@@ -336,10 +350,10 @@ namespace pt_mcc
     {
 
         // Validate input tensor shapes
-        TORCH_CHECK(start_indices.dim() == 1, "transform_indices expects start_indices with shape (num_indices)");
+        TORCH_CHECK(start_indices.dim() == 1 && is_int32_indices(start_indices), "transform_indices expects int32 start_indices with shape (num_indices)");
         int num_indices = start_indices.size(0);
 
-        TORCH_CHECK(new_indices.dim() == 1, "transform_indices expects new_indices with shape (num_points)");
+        TORCH_CHECK(new_indices.dim() == 1 && is_int32_indices(new_indices), "transform_indices expects int32 new_indices with shape (num_points)");
         int num_points = new_indices.size(0);
 
         TORCH_CHECK(start_indices.device().is_cuda(), "Input tensors must be on CUDA device");
@@ -375,6 +389,7 @@ namespace pt_mcc
         m.def("sort_points_step2_grad(Tensor new_indices, Tensor output_grad, Tensor output_feature_grad) -> (Tensor, Tensor)");
         m.def("sort_features_back(Tensor features, Tensor new_indices) -> Tensor");
         m.def("sort_features(Tensor features, Tensor new_indices) -> Tensor");
+        m.def("sort_features.out(Tensor features, Tensor new_indices, *, Tensor(a!) out) -> Tensor(a!)");
         m.def("sort_features_back_grad(Tensor new_indices, Tensor output_feature_grad) -> Tensor");
         m.def("transform_indices(Tensor start_indices, Tensor new_indices) -> Tensor");
     }
@@ -387,6 +402,7 @@ namespace pt_mcc
         m.impl("sort_points_step2_grad", &sort_points_step2_grad);
         m.impl("sort_features_back", &sort_features_back);
         m.impl("sort_features", &sort_features);
+        m.impl("sort_features.out", &sort_features_out);
         m.impl("sort_features_back_grad", &sort_features_back_grad);
         m.impl("transform_indices", &transform_indices);
     }
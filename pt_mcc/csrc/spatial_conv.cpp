@@ -1,4 +1,5 @@
 #include <torch/extension.h>
+#include "tensor_checks.h"
 #include <iostream>
 
 #ifndef BLOCK_MLP_SIZE
@@ -20,6 +21,7 @@ namespace pt_mcc
         const int *pBatchIds,
         const float *pInFeatures,
         const float *pPDFs,
+        int pPDFStride,
         const float *pSamples,
         const int *pStartIndexs,
         const int *pPackedNeighs,
@@ -47,6 +49,7 @@ namespace pt_mcc
         const int *pBatchIds,
         const float *pInFeatures,
         const float *pPDFs,
+        int pPDFStride,
         const float *pSamples,
         const int *pStartIndexs,
         const int *pPackedNeighs,
@@ -72,22 +75,15 @@ namespace pt_mcc
         return BLOCK_MLP_SIZE;
     }
 
-    torch::Tensor spatial_conv(
-        torch::Tensor in_points, torch::Tensor in_features, torch::Tensor batch_ids, torch::Tensor in_pdfs,
-        torch::Tensor in_samples, torch::Tensor start_index, torch::Tensor packed_neigh, torch::Tensor in_aabb_min,
-        torch::Tensor in_aabb_max, torch::Tensor in_weights_hidd1, torch::Tensor in_weights_hidd2, torch::Tensor in_weights_out,
-        torch::Tensor in_bias_hidd1, torch::Tensor in_bias_hidd2, torch::Tensor in_bias_out,
-        torch::Tensor num_out_features_tensor, torch::Tensor combin_tensor, torch::Tensor batch_size_tensor, torch::Tensor radius_tensor,
-        torch::Tensor scale_inv_tensor, torch::Tensor avg_tensor)
+    torch::Tensor &spatial_conv_out(
+        const torch::Tensor &in_points, const torch::Tensor &in_features, const torch::Tensor &batch_ids, const c10::optional<torch::Tensor> &in_pdfs,
+        const torch::Tensor &in_samples, const torch::Tensor &start_index, const torch::Tensor &packed_neigh, const torch::Tensor &in_aabb_min,
+        const torch::Tensor &in_aabb_max, const torch::Tensor &in_weights_hidd1, const torch::Tensor &in_weights_hidd2, const torch::Tensor &in_weights_out,
+        const torch::Tensor &in_bias_hidd1, const torch::Tensor &in_bias_hidd2, const torch::Tensor &in_bias_out,
+        int64_t num_out_features, bool combin, int64_t batch_size, double radius,
+        bool scale_inv, bool avg, torch::Tensor &out_conv_features)
     {
-        int64_t num_out_features = num_out_features_tensor.item<int64_t>();
-        bool combin = combin_tensor.item<bool>();
-        int64_t batch_size = batch_size_tensor.item<int64_t>();
-        double radius = radius_tensor.item<double>();
-        bool scale_inv = scale_inv_tensor.item<bool>();
-        bool avg = avg_tensor.item<bool>();
-
-        TORCH_CHECK(in_points.is_cuda() && in_features.is_cuda() && batch_ids.is_cuda() && in_pdfs.is_cuda() && in_samples.is_cuda(), "all inputs should be on CUDA - 1");
+        TORCH_CHECK(in_points.is_cuda() && in_features.is_cuda() && batch_ids.is_cuda() && in_samples.is_cuda(), "all inputs should be on CUDA - 1");
         TORCH_CHECK(start_index.is_cuda() && packed_neigh.is_cuda() && in_aabb_min.is_cuda() && in_aabb_max.is_cuda(), "all inputs should be on CUDA - 2");
         TORCH_CHECK(in_weights_hidd1.is_cuda() && in_weights_hidd2.is_cuda() && in_weights_out.is_cuda(), "all inputs should be on CUDA - 3");
         TORCH_CHECK(in_bias_hidd1.is_cuda() && in_bias_hidd2.is_cuda() && in_bias_out.is_cuda(), "all inputs should be on CUDA - 4");
@@ -101,15 +97,25 @@ namespace pt_mcc
         TORCH_CHECK(in_features.dim() == 2 && in_features.size(0) == num_points, "in_features must be of shape (num_points, num_in_features)");
         int num_in_features = in_features.size(1);
 
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(1) == 1 && batch_ids.size(0) == num_points, "batch_ids must be of shape (num_points, 1)");
-        TORCH_CHECK(in_pdfs.dim() == 2 && in_pdfs.size(1) == 1, "in_pdfs must be of shape (num_neighs, 1)");
-        int num_neighs = in_pdfs.size(0);
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, num_points), "batch_ids must be contiguous int32 with shape (num_points) or (num_points, 1)");
+        TORCH_CHECK(packed_neigh.dim() == 2 && packed_neigh.size(1) == 2 && is_int32_indices(packed_neigh), "packed_neigh must be contiguous int32 with shape (num_neighs, 2)");
+        int num_neighs = packed_neigh.size(0);
+        // Without pdf values the neighbors are not weighted by their density.
+        const float *in_pdfs_ptr = nullptr;
+        int pdf_stride = 0;
+        if (in_pdfs.has_value())
+        {
+            TORCH_CHECK(in_pdfs->is_cuda() && in_pdfs->is_contiguous(), "in_pdfs should be a contiguous tensor on CUDA");
+            TORCH_CHECK(in_pdfs->dim() == 2 && in_pdfs->size(1) == 1 && (in_pdfs->size(0) == num_neighs || in_pdfs->size(0) == 1),
+                        "in_pdfs must be of shape (num_neighs, 1) or (1, 1)");
+            pdf_stride = (in_pdfs->size(0) == 1) ? 0 : 1;
+            in_pdfs_ptr = in_pdfs->data_ptr<float>();
+        }
 
         TORCH_CHECK(in_samples.dim() == 2 && in_samples.size(1) == 3, "in_samples must be of shape (num_samples, 3)");
         int num_samples = in_samples.size(0);
 
-        TORCH_CHECK(start_index.dim() == 2 && start_index.size(1) == 1 && start_index.size(0) == num_samples, "start_index must be of shape (num_samples, 1)");
-        TORCH_CHECK(packed_neigh.dim() == 2 && packed_neigh.size(0) == num_neighs && packed_neigh.size(1) == 2, "packed_neigh must be of shape (num_neighs, 2)");
+        TORCH_CHECK(start_index.dim() == 2 && start_index.size(1) == 1 && start_index.size(0) == num_samples && is_int32_indices(start_index), "start_index must be contiguous int32 with shape (num_samples, 1)");
         TORCH_CHECK(in_aabb_min.dim() == 2 && in_aabb_min.size(0) == batch_size && in_aabb_min.size(1) == 3, "in_aabb_min must be of shape (batch_size, 3)");
         TORCH_CHECK(in_aabb_max.dim() == 2 && in_aabb_max.size(0) == batch_size && in_aabb_max.size(1) == 3, "in_aabb_max must be of shape (batch_size, 3)");
         TORCH_CHECK(in_weights_hidd1.dim() == 2 && in_weights_hidd1.size(0) == 3 && in_bias_hidd1.dim() == 1 &&
@@ -128,14 +134,17 @@ namespace pt_mcc
             TORCH_CHECK(in_weights_out.size(1) == num_in_features, "Input and output features must match for combin=false");
         }
 
-        // Initialize output tensor
-        torch::Tensor out_conv_features = torch::zeros({num_samples, num_out_features}, torch::dtype(torch::kFloat32).device(in_points.device()));
+        // Check the output tensor. The kernels initialize it before accumulating the features.
+        TORCH_CHECK(out_conv_features.is_cuda() && out_conv_features.dtype() == torch::kFloat32 && out_conv_features.is_contiguous(),
+                    "out must be a contiguous float tensor on CUDA");
+        TORCH_CHECK(out_conv_features.dim() == 2 && out_conv_features.size(0) == num_samples && out_conv_features.size(1) == num_out_features,
+                    "out must be of shape (num_samples, num_out_features)");
 
         // Call the kernel function
         spatialConvCPU(
             avg, scale_inv, num_neighs, num_in_features, num_out_features, num_samples, combin, radius,
             in_points.data_ptr<float>(), batch_ids.data_ptr<int>(), in_features.data_ptr<float>(),
-            in_pdfs.data_ptr<float>(), in_samples.data_ptr<float>(), start_index.data_ptr<int>(),
+            in_pdfs_ptr, pdf_stride, in_samples.data_ptr<float>(), start_index.data_ptr<int>(),
             packed_neigh.data_ptr<int>(), in_aabb_min.data_ptr<float>(), in_aabb_max.data_ptr<float>(),
             in_weights_hidd1.data_ptr<float>(), in_bias_hidd1.data_ptr<float>(), in_weights_hidd2.data_ptr<float>(),
             in_bias_hidd2.data_ptr<float>(), in_weights_out.data_ptr<float>(), in_bias_out.data_ptr<float>(),
@@ -144,11 +153,31 @@ namespace pt_mcc
         return out_conv_features;
     }
 
+    torch::Tensor spatial_conv(
+        torch::Tensor in_points, torch::Tensor in_features, torch::Tensor batch_ids, c10::optional<torch::Tensor> in_pdfs,
+        torch::Tensor in_samples, torch::Tensor start_index, torch::Tensor packed_neigh, torch::Tensor in_aabb_min,
+        torch::Tensor in_aabb_max, torch::Tensor in_weights_hidd1, torch::Tensor in_weights_hidd2, torch::Tensor in_weights_out,
+        torch::Tensor in_bias_hidd1, torch::Tensor in_bias_hidd2, torch::Tensor in_bias_out,
+        int64_t num_out_features, bool combin, int64_t batch_size, double radius,
+        bool scale_inv, bool avg)
+    {
+        // Allocate the output tensor
+        torch::Tensor out_conv_features = torch::empty({in_samples.size(0), num_out_features},
+                                                       torch::dtype(torch::kFloat32).device(in_points.device()));
+
+        spatial_conv_out(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min,
+                         in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out,
+                         num_out_features, combin, batch_size, radius, scale_inv, avg,
+                         out_conv_features);
+
+        return out_conv_features;
+    }
+
     std::tuple<torch::Tensor, torch::Tensor, torch::Tensor, torch::Tensor, torch::Tensor, torch::Tensor, torch::Tensor> spatial_conv_grad(
         torch::Tensor in_points,
         torch::Tensor in_features,
         torch::Tensor batch_ids,
-        torch::Tensor in_pdfs,
+        c10::optional<torch::Tensor> in_pdfs,
         torch::Tensor in_samples,
         torch::Tensor start_index,
         torch::Tensor packed_neigh,
@@ -175,15 +204,25 @@ namespace pt_mcc
         TORCH_CHECK(in_features.dim() == 2 && in_features.size(0) == num_points, "in_features must have dimensions (numPoints, numInFeatures)");
         int num_in_features = in_features.size(1);
 
-        TORCH_CHECK(batch_ids.dim() == 2 && batch_ids.size(1) == 1 && batch_ids.size(0) == num_points, "batch_ids must have dimensions (numPoints, 1)");
-        TORCH_CHECK(in_pdfs.dim() == 2 && in_pdfs.size(1) == 1, "in_pdfs must have dimensions (num_neighs, 1)");
-        int num_neighs = in_pdfs.size(0);
+        TORCH_CHECK(is_valid_batch_ids(batch_ids, num_points), "batch_ids must be contiguous int32 with dimensions (numPoints) or (numPoints, 1)");
+        TORCH_CHECK(packed_neigh.dim() == 2 && packed_neigh.size(1) == 2 && is_int32_indices(packed_neigh), "packed_neigh must be contiguous int32 with dimensions (numNeighs, 2)");
+        int num_neighs = packed_neigh.size(0);
+        // Without pdf values the neighbors are not weighted by their density.
+        const float *in_pdfs_ptr = nullptr;
+        int pdf_stride = 0;
+        if (in_pdfs.has_value())
+        {
+            TORCH_CHECK(in_pdfs->is_cuda() && in_pdfs->is_contiguous(), "in_pdfs should be a contiguous tensor on CUDA");
+            TORCH_CHECK(in_pdfs->dim() == 2 && in_pdfs->size(1) == 1 && (in_pdfs->size(0) == num_neighs || in_pdfs->size(0) == 1),
+                        "in_pdfs must have dimensions (num_neighs, 1) or (1, 1)");
+            pdf_stride = (in_pdfs->size(0) == 1) ? 0 : 1;
+            in_pdfs_ptr = in_pdfs->data_ptr<float>();
+        }
 
         TORCH_CHECK(in_samples.dim() == 2 && in_samples.size(1) == 3, "in_samples must have dimensions (numSamples, 3)");
         int num_samples = in_samples.size(0);
 
-        TORCH_CHECK(start_index.dim() == 2 && start_index.size(1) == 1 && start_index.size(0) == num_samples, "start_index must have dimensions (numSamples, 1)");
-        TORCH_CHECK(packed_neigh.dim() == 2 && packed_neigh.size(0) == num_neighs && packed_neigh.size(1) == 2, "packed_neigh must have dimensions (numNeighs, 2)");
+        TORCH_CHECK(start_index.dim() == 2 && start_index.size(1) == 1 && start_index.size(0) == num_samples && is_int32_indices(start_index), "start_index must be contiguous int32 with dimensions (numSamples, 1)");
         TORCH_CHECK(in_aabb_min.dim() == 2 && in_aabb_min.size(0) == batch_size && in_aabb_min.size(1) == 3, "in_aabb_min must have dimensions (batchSize, 3)");
         TORCH_CHECK(in_aabb_max.dim() == 2 && in_aabb_max.size(0) == batch_size && in_aabb_max.size(1) == 3, "in_aabb_max must have dimensions (batchSize, 3)");
         TORCH_CHECK(in_weights_hidd1.dim() == 2 && in_weights_hidd1.size(0) == 3 &&
@@ -227,7 +266,6 @@ namespace pt_mcc
         const float *in_points_ptr = in_points.data_ptr<float>();
         const float *in_features_ptr = in_features.data_ptr<float>();
         const int *batch_ids_ptr = batch_ids.data_ptr<int>();
-        const float *in_pdfs_ptr = in_pdfs.data_ptr<float>();
         const float *in_samples_ptr = in_samples.data_ptr<float>();
         const int *start_index_ptr = start_index.data_ptr<int>();
         const int *packed_neigh_ptr = packed_neigh.data_ptr<int>();
@@ -252,7 +290,7 @@ namespace pt_mcc
         // Call the CPU function
         spatialConvGradsCPU(
             avg, scale_inv, num_neighs, num_in_features, num_out_features, num_samples, num_points,
-            combin, radius, in_points_ptr, batch_ids_ptr, in_features_ptr, in_pdfs_ptr, in_samples_ptr,
+            combin, radius, in_points_ptr, batch_ids_ptr, in_features_ptr, in_pdfs_ptr, pdf_stride, in_samples_ptr,
             start_index_ptr, packed_neigh_ptr, in_aabb_min_ptr, in_aabb_max_ptr, in_weights_hidd1_ptr,
             in_bias_hidd1_ptr, in_weights_hidd2_ptr, in_bias_hidd2_ptr, in_weights_out_ptr, in_bias_out_ptr,
             in_out_feature_grads_ptr, feature_gradients_ptr, weight1_grads_ptr, weight2_grads_ptr,
@@ -265,8 +303,9 @@ namespace pt_mcc
 
     void register_spatial_connv(torch::Library &m)
     {
-        m.def("spatial_conv(Tensor in_points, Tensor in_features, Tensor batch_ids, Tensor in_pdfs, Tensor in_samples, Tensor start_index, Tensor packed_neigh, Tensor in_aabb_min, Tensor in_aabb_max, Tensor in_weights_hidd1, Tensor in_weights_hidd2, Tensor in_weights_out, Tensor in_bias_hidd1, Tensor in_bias_hidd2, Tensor in_bias_out, Tensor num_out_features, Tensor combin, Tensor batch_size, Tensor radius, Tensor scale_inv, Tensor avg) -> Tensor");
-        m.def("spatial_conv_grad(Tensor in_points, Tensor in_features, Tensor batch_ids, Tensor in_pdfs, Tensor in_samples, Tensor start_index, Tensor packed_neigh, Tensor in_aabb_min, Tensor in_aabb_max, Tensor in_weights_hidd1, Tensor in_weights_hidd2, Tensor in_weights_out, Tensor in_bias_hidd1, Tensor in_bias_hidd2, Tensor in_bias_out, Tensor in_out_feature_grads, int num_out_features, bool combin, int batch_size, float radius, bool scale_inv, bool avg) -> (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor)");
+        m.def("spatial_conv(Tensor in_points, Tensor in_features, Tensor batch_ids, Tensor? in_pdfs, Tensor in_samples, Tensor start_index, Tensor packed_neigh, Tensor in_aabb_min, Tensor in_aabb_max, Tensor in_weights_hidd1, Tensor in_weights_hidd2, Tensor in_weights_out, Tensor in_bias_hidd1, Tensor in_bias_hidd2, Tensor in_bias_out, int num_out_features, bool combin, int batch_size, float radius, bool scale_inv, bool avg) -> Tensor");
+        m.def("spatial_conv.out(Tensor in_points, Tensor in_features, Tensor batch_ids, Tensor? in_pdfs, Tensor in_samples, Tensor start_index, Tensor packed_neigh, Tensor in_aabb_min, Tensor in_aabb_max, Tensor in_weights_hidd1, Tensor in_weights_hidd2, Tensor in_weights_out, Tensor in_bias_hidd1, Tensor in_bias_hidd2, Tensor in_bias_out, int num_out_features, bool combin, int batch_size, float radius, bool scale_inv, bool avg, *, Tensor(a!) out) -> Tensor(a!)");
+        m.def("spatial_conv_grad(Tensor in_points, Tensor in_features, Tensor batch_ids, Tensor? in_pdfs, Tensor in_samples, Tensor start_index, Tensor packed_neigh, Tensor in_aabb_min, Tensor in_aabb_max, Tensor in_weights_hidd1, Tensor in_weights_hidd2, Tensor in_weights_out, Tensor in_bias_hidd1, Tensor in_bias_hidd2, Tensor in_bias_out, Tensor in_out_feature_grads, int num_out_features, bool combin, int batch_size, float radius, bool scale_inv, bool avg) -> (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor, Tensor)");
         m.def("get_block_size", &get_block_size);
     }
 
@@ -274,6 +313,7 @@ namespace pt_mcc
     TORCH_LIBRARY_IMPL(pt_mcc, CUDA, m)
     {
         m.impl("spatial_conv", &spatial_conv);
+        m.impl("spatial_conv.out", &spatial_conv_out);
         m.impl("spatial_conv_grad", &spatial_conv_grad);
     }
 }
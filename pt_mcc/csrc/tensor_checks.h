@@ -0,0 +1,49 @@
+/////////////////////////////////////////////////////////////////////////////
+/// \file tensor_checks.h
+///
+/// \brief Utilities to validate the input tensors of the operations.
+///
+/// \copyright Copyright (c) 2018 Visual Computing group of Ulm University,
+///            Germany. See the LICENSE file at the top-level directory of
+///            this distribution.
+///
+/// \author pedro hermosilla (pedro-1.hermosilla-casajus@uni-ulm.de)
+/////////////////////////////////////////////////////////////////////////////
+
+#ifndef TENSOR_CHECKS_H_
+#define TENSOR_CHECKS_H_
+
+#include <torch/extension.h>
+
+namespace pt_mcc
+{
+    /**
+     *  Method to check the type and layout of a tensor of point indices. All the
+     *  index tensors of the operations (batch ids, sorting keys and indices,
+     *  neighbor lists, and sampled indices) are int32, since the number of points
+     *  of a batch fits in 32 bits, and they should be contiguous since the kernels
+     *  index them with flat offsets.
+     *  @param  pIndices    Tensor of indices.
+     *  @return True if the type and layout of the tensor are valid.
+     */
+    inline bool is_int32_indices(const torch::Tensor &pIndices)
+    {
+        return pIndices.scalar_type() == torch::kInt32 && pIndices.is_contiguous();
+    }
+
+    /**
+     *  Method to check the shape of a tensor of batch ids. The batch ids can
+     *  be provided as a flat tensor (N) or as a column tensor (N, 1) of int32
+     *  values.
+     *  @param  pBatchIds   Tensor of batch ids.
+     *  @param  pNumPoints  Number of points.
+     *  @return True if the shape, type and layout of the tensor are valid.
+     */
+    inline bool is_valid_batch_ids(const torch::Tensor &pBatchIds, int64_t pNumPoints)
+    {
+        return (pBatchIds.dim() == 1 || (pBatchIds.dim() == 2 && pBatchIds.size(1) == 1)) &&
+               pBatchIds.size(0) == pNumPoints && is_int32_indices(pBatchIds);
+    }
+}
+
+#endif
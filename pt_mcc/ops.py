@@ -7,7 +7,11 @@ def mymuladd(a: Tensor, b: Tensor, c: float) -> Tensor:
     """Performs a * b + c in an efficient fused kernel"""
     return torch.ops.pt_mcc.mymuladd.default(a, b, c)
 
-def compute_aabb(pts: Tensor, batch_ids: Tensor, batch_size: int, inv_inf: bool):
+def compute_aabb(pts: Tensor, batch_ids: Tensor, batch_size: int, inv_inf: bool, out=None):
+    """Computes the bounding box of each point cloud. If out is a tuple (aabb_min, aabb_max),
+    the bounding boxes are written into its tensors"""
+    if out is not None:
+        return torch.ops.pt_mcc.compute_aabb.out(pts, batch_ids, batch_size, inv_inf, aabbMin=out[0], aabbMax=out[1])
     return torch.ops.pt_mcc.compute_aabb.default(pts, batch_ids, batch_size, inv_inf)
 
 def compute_pdf(pts, batch_ids, aabb_min, aabb_max, start_indexes, neighbors, window, radius, batch_size, scale_inv):
@@ -19,6 +23,16 @@ def find_neighbors(pts, batch_ids, pts2, cell_indices, aabb_min, aabb_max, radiu
 def poisson_sampling(points, batch_ids, cell_indices, aabb_min, aabb_max, radius, batch_size, scale_inv):
     return torch.ops.pt_mcc.poisson_sampling(points, batch_ids, cell_indices, aabb_min, aabb_max, radius, batch_size, scale_inv)
 
+def build_hierarchy_level(points, batch_ids, aabb_min, aabb_max, radius, batch_size, scale_inv):
+    """Computes the next level of a point hierarchy with poisson disk sampling. Returns the
+    sampled points, their batch ids, and their indices in the input point cloud"""
+    return torch.ops.pt_mcc.build_hierarchy_level(points, batch_ids, aabb_min, aabb_max, radius, batch_size, scale_inv)
+
+def build_hierarchy(points, batch_ids, aabb_min, aabb_max, radii, batch_size, scale_inv):
+    """Computes all the levels of a point hierarchy, one per radius. Returns the lists of
+    sampled points, batch ids, and indices of each level in the points of the previous level"""
+    return torch.ops.pt_mcc.build_hierarchy(points, batch_ids, aabb_min, aabb_max, radii, batch_size, scale_inv)
+
 def get_sampled_features(pts_indices, features):
     return torch.ops.pt_mcc.get_sampled_features(pts_indices, features)
 
@@ -58,7 +72,11 @@ def _sort_points_step2_backward(ctx, grad_out_points, grad_out_batch_ids, grad_o
     
     return ptsGrad, None, inFeatureGrad, None, None, None, None, None, None, None
 
-def sort_features(features, indices):
+def sort_features(features, indices, out=None):
+    """Sorts the features with the indices computed by sort_points_step1. If out is provided,
+    the sorted features are written into it. The out variant is not differentiable"""
+    if out is not None:
+        return torch.ops.pt_mcc.sort_features.out(features, indices, out=out)
     return torch.ops.pt_mcc.sort_features(features, indices)
 
 def _setup_sort_features_context(ctx, inputs, output):
@@ -98,7 +116,12 @@ def _sort_features_back_backward(ctx, grad):
 def transform_indices(start_indices, new_indices):
     return torch.ops.pt_mcc.transform_indices(start_indices, new_indices)
 
-def spatial_conv(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg):
+def spatial_conv(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg, out=None):
+    """Evaluates the monte carlo convolution. If in_pdfs is None, the neighbors are not weighted
+    by their density. If out is provided, the convoluted features are written into it. The out
+    variant is not differentiable"""
+    if out is not None:
+        return torch.ops.pt_mcc.spatial_conv.out(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg, out=out)
     return torch.ops.pt_mcc.spatial_conv(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg)
         
 def _setup_spatial_conv_context(ctx, inputs, output):
@@ -118,12 +141,6 @@ def _setup_spatial_conv_context(ctx, inputs, output):
     saved_bias_hidd1 = None
     saved_bias_hidd2 = None
     saved_bias_out = None
-    saved_num_out_features = None
-    saved_combin = None
-    saved_batch_size = None
-    saved_radius = None
-    saved_scale_inv = None
-    saved_avg = None
     saved_out_features = None
     if ctx.needs_input_grad[1] or ctx.needs_input_grad[9] or ctx.needs_input_grad[10]:
         saved_points = in_points
@@ -141,16 +158,17 @@ def _setup_spatial_conv_context(ctx, inputs, output):
         saved_bias_hidd1 = in_bias_hidd1
         saved_bias_hidd2 = in_bias_hidd2
         saved_bias_out = in_bias_out
-        saved_num_out_features = num_out_features
-        saved_combin = combin
-        saved_batch_size = batch_size
-        saved_radius = radius
-        saved_scale_inv = scale_inv
-        saved_avg = avg
-    ctx.save_for_backward(saved_points, saved_features, saved_batch_ids, saved_pdfs, saved_sampled, saved_start_index, saved_packed_neigh, saved_aabb_min, saved_aabb_max, saved_weights_hidd1, saved_weights_hidd2, saved_weights_out, saved_bias_hidd1, saved_bias_hidd2, saved_bias_out, saved_num_out_features, saved_combin, saved_batch_size, saved_radius, saved_scale_inv, saved_avg)
+    ctx.save_for_backward(saved_points, saved_features, saved_batch_ids, saved_pdfs, saved_sampled, saved_start_index, saved_packed_neigh, saved_aabb_min, saved_aabb_max, saved_weights_hidd1, saved_weights_hidd2, saved_weights_out, saved_bias_hidd1, saved_bias_hidd2, saved_bias_out)
+    # The configuration of the convolution is made of python scalars.
+    ctx.num_out_features = num_out_features
+    ctx.combin = combin
+    ctx.batch_size = batch_size
+    ctx.radius = radius
+    ctx.scale_inv = scale_inv
+    ctx.avg = avg
 
 def _spatial_conv_backward(ctx, grad):
-    in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg = ctx.saved_tensors
+    in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out = ctx.saved_tensors
     featureGrads = None
     weights1Grads = None 
     weights2Grads = None 
@@ -161,7 +179,7 @@ def _spatial_conv_backward(ctx, grad):
     
     if ctx.needs_input_grad[1] or ctx.needs_input_grad[9] or ctx.needs_input_grad[10]:
         featureGrads, weights1Grads, biases1Grads, weights2Grads, biases2Grads, weightsOutGrads, biasesOutGrads = \
-            torch.ops.pt_mcc.spatial_conv_grad(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, grad, num_out_features.item(), combin.item(), batch_size.item(), radius.item(), scale_inv.item(), avg.item())
+            torch.ops.pt_mcc.spatial_conv_grad(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, grad, ctx.num_out_features, ctx.combin, ctx.batch_size, ctx.radius, ctx.scale_inv, ctx.avg)
 
     return None, featureGrads, None, None, None, None, None, None, None, weights1Grads, weights2Grads, weightsOutGrads,biases1Grads, biases2Grads, biasesOutGrads, None, None, None, None, None, None
 
@@ -185,31 +203,37 @@ def _(a, b, c):
 def _(pts, batch_ids, batch_size, scale_inv):
     torch._check(pts.device == batch_ids.device)
     torch._check(pts.dim() == 2)
-    torch._check(batch_ids.dim() == 2)
-    torch._check(pts.shape[0] == batch_size.shape[0])
-    torch._check(batch_size.dtype == torch.int)
-    torch._check(scale_inv.dtype == torch.bool)
-    return (torch.empty_like(pts), torch.empty_like(pts))
+    torch._check(batch_ids.dim() in (1, 2))
+    torch._check(pts.shape[0] == batch_ids.shape[0])
+    aabb_min = torch.empty((batch_size, 3), dtype=pts.dtype, device=pts.device)
+    aabb_max = torch.empty((batch_size, 3), dtype=pts.dtype, device=pts.device)
+    return aabb_min, aabb_max
+
+@torch.library.register_fake("pt_mcc::compute_aabb.out")
+def _(pts, batch_ids, batch_size, scale_inv, *, aabbMin, aabbMax):
+    torch._check(pts.device == batch_ids.device)
+    torch._check(pts.dim() == 2)
+    torch._check(batch_ids.dim() in (1, 2))
+    torch._check(pts.shape[0] == batch_ids.shape[0])
+    torch._check(aabbMin.shape == (batch_size, 3))
+    torch._check(aabbMax.shape == (batch_size, 3))
+    return aabbMin, aabbMax
 
 @torch.library.register_fake("pt_mcc::compute_pdf")
 def _(pts, batch_ids, aabb_min, aabb_max, start_indexes, neighbors, window, radius, batch_size, scale_inv):
     torch._check(pts.device == batch_ids.device)
     torch._check(pts.dim() == 2)
-    torch._check(batch_ids.dim() == 2)
+    torch._check(batch_ids.dim() in (1, 2))
     torch._check(aabb_min.dim() == 2)
     torch._check(aabb_max.dim() == 2)
     torch._check(start_indexes.dim() == 2)
     torch._check(neighbors.dim() == 2)
-    torch._check(pts.shape[0] == batch_size.shape[0])
+    torch._check(pts.shape[0] == batch_ids.shape[0])
     torch._check(neighbors.shape[1] == 2)
     torch._check(aabb_min.shape[0] == batch_size)
     torch._check(aabb_max.shape[0] == batch_size)
-    torch._check(window.dtype == torch.float)
-    torch._check(radius.dtype == torch.float)
-    torch._check(batch_size.dtype == torch.int)
-    torch._check(scale_inv.dtype == torch.bool)
     num_neighbors = neighbors.shape[0]
-    return torch.empty((num_neighbors, 1), dtype=torch.float)
+    return torch.empty((num_neighbors, 1), dtype=torch.float, device=pts.device)
 
 @torch.library.register_fake("pt_mcc::find_neighbors")
 def _(pts, batch_ids, pts2, cell_indices, aabb_min, aabb_max, radius, batch_size, scale_inv):
@@ -217,76 +241,158 @@ def _(pts, batch_ids, pts2, cell_indices, aabb_min, aabb_max, radius, batch_size
     torch._check(pts.dim() == 2)
     torch._check(pts2.dim() == 2)
     torch._check(cell_indices.dim() == 5 and cell_indices.shape[0] == batch_size)
-
-    torch._check(batch_ids.dim() == 2)
+    torch._check(batch_ids.dim() in (1, 2))
     torch._check(aabb_min.dim() == 2)
     torch._check(aabb_max.dim() == 2)
     torch._check(aabb_min.shape[0] == batch_size)
     torch._check(aabb_max.shape[0] == batch_size)
-    torch._check(radius.dtype == torch.float)
-    torch._check(batch_size.dtype == torch.int)
-    torch._check(scale_inv.dtype == torch.bool)
 
+    # The number of neighbors depends on the data.
     num_pts = pts.shape[0]
-    num_neigh = 100 # just some placeholder, it will be different for different input
-    return torch.empty((num_pts, 1), dtype=torch.int), torch.empty((num_neigh, 1), dtype=torch.int)
+    num_neigh = torch.library.get_ctx().new_dynamic_size()
+    start_indexes = torch.empty((num_pts, 1), dtype=torch.int, device=pts.device)
+    neigh_indexes = torch.empty((num_neigh, 2), dtype=torch.int, device=pts.device)
+    return start_indexes, neigh_indexes
 
 @torch.library.register_fake("pt_mcc::poisson_sampling")
 def _(pts, batch_ids, cell_indices, aabb_min, aabb_max, radius, batch_size, scale_inv):
     torch._check(pts.device == batch_ids.device)
     torch._check(pts.dim() == 2)
     torch._check(cell_indices.dim() == 5 and cell_indices.shape[0] == batch_size)
-
-    torch._check(batch_ids.dim() == 2)
+    torch._check(batch_ids.dim() in (1, 2))
     torch._check(aabb_min.dim() == 2)
     torch._check(aabb_max.dim() == 2)
     torch._check(aabb_min.shape[0] == batch_size)
     torch._check(aabb_max.shape[0] == batch_size)
-    torch._check(radius.dtype == torch.float)
-    torch._check(batch_size.dtype == torch.int)
-    torch._check(scale_inv.dtype == torch.bool)
-
-    num_sel_samples = 100 # just some placeholder, it will be different for different input
-    pts = torch.empty((num_sel_samples, 3), dtype=torch.float)
-    batches = torch.empty((num_sel_samples, 1), dtype=torch.int)
-    indices = torch.empty((num_sel_samples, 1), dtype=torch.int)
+
+    # The number of selected samples depends on the data.
+    num_sel_samples = torch.library.get_ctx().new_dynamic_size()
+    pts = torch.empty((num_sel_samples, 3), dtype=pts.dtype, device=pts.device)
+    batches = batch_ids.new_empty((num_sel_samples,) + tuple(batch_ids.shape[1:]))
+    indices = torch.empty((num_sel_samples,), dtype=batch_ids.dtype, device=batch_ids.device)
     return pts, batches, indices
 
+@torch.library.register_fake("pt_mcc::build_hierarchy_level")
+def _(points, batch_ids, aabb_min, aabb_max, radius, batch_size, scale_inv):
+    torch._check(points.device == batch_ids.device)
+    torch._check(points.dim() == 2)
+    torch._check(batch_ids.dim() in (1, 2))
+    torch._check(points.shape[0] == batch_ids.shape[0])
+    torch._check(aabb_min.shape[0] == batch_size)
+    torch._check(aabb_max.shape[0] == batch_size)
+
+    # The number of selected samples depends on the data.
+    num_sel_samples = torch.library.get_ctx().new_dynamic_size()
+    sampled_points = points.new_empty((num_sel_samples, 3))
+    sampled_batch_ids = batch_ids.new_empty((num_sel_samples,) + tuple(batch_ids.shape[1:]))
+    input_indices = torch.empty((num_sel_samples,), dtype=torch.int, device=points.device)
+    return sampled_points, sampled_batch_ids, input_indices
+
+@torch.library.register_fake("pt_mcc::build_hierarchy")
+def _(points, batch_ids, aabb_min, aabb_max, radii, batch_size, scale_inv):
+    torch._check(points.device == batch_ids.device)
+    torch._check(points.dim() == 2)
+    torch._check(batch_ids.dim() in (1, 2))
+    torch._check(points.shape[0] == batch_ids.shape[0])
+    torch._check(aabb_min.shape[0] == batch_size)
+    torch._check(aabb_max.shape[0] == batch_size)
+
+    # The number of selected samples of each level depends on the data.
+    level_points, level_batch_ids, level_indices = [], [], []
+    for _radius in radii:
+        num_sel_samples = torch.library.get_ctx().new_dynamic_size()
+        level_points.append(points.new_empty((num_sel_samples, 3)))
+        level_batch_ids.append(batch_ids.new_empty((num_sel_samples,) + tuple(batch_ids.shape[1:])))
+        level_indices.append(torch.empty((num_sel_samples,), dtype=torch.int, device=points.device))
+    return level_points, level_batch_ids, level_indices
+
 @torch.library.register_fake("pt_mcc::get_sampled_features")
 def _(pts_indices, features):
-    torch._check(pts_indices.dim() == 1)
+    torch._check(pts_indices.dim() == 1 and pts_indices.dtype == torch.int32)
     torch._check(features.dim() == 2)
-
     num_sampled_points = pts_indices.shape[0]
     num_features = features.shape[1]
-    return torch.empty((num_sampled_points, num_features), dtype=torch.float)
+    return features.new_empty((num_sampled_points, num_features))
+
+@torch.library.register_fake("pt_mcc::get_sampled_features_grad")
+def _(pts_indices, features, sampled_features_grad):
+    torch._check(pts_indices.dim() == 1 and pts_indices.dtype == torch.int32)
+    torch._check(features.dim() == 2)
+    torch._check(sampled_features_grad.dim() == 2)
+    return torch.empty_like(features)
 
 @torch.library.register_fake("pt_mcc::sort_points_step1")
 def _(pts, batch_ids, aabb_min, aabb_max, batch_size, cell_size, scale_inv):
+    torch._check(pts.dim() == 2)
+    torch._check(pts.shape[0] == batch_ids.shape[0])
     num_pts = pts.shape[0]
-    return torch.empty((num_pts), dtype=torch.int), torch.empty((num_pts), dtype=torch.int)
+    keys = torch.empty((num_pts,), dtype=torch.int, device=pts.device)
+    indices = torch.empty((num_pts,), dtype=torch.int, device=pts.device)
+    return keys, indices
 
 @torch.library.register_fake("pt_mcc::sort_points_step2")
 def _(pts, batch_ids, features, keys, indices, aabb_min, aabb_max, batch_size, cell_size, scale_inv):
-    num_cells = 100 # just some placeholder
-    return torch.empty_like(pts), torch.empty_like(batch_ids), torch.empty_like(features), torch.empty((batch_size, num_cells, num_cells, num_cells, 2))
+    torch._check(pts.dim() == 2)
+    torch._check(features.dim() == 2)
+    torch._check(keys.dim() == 1 and keys.shape[0] == pts.shape[0] and keys.dtype == torch.int32)
+    torch._check(indices.dim() == 1 and indices.shape[0] == pts.shape[0] and indices.dtype == torch.int32)
+
+    # The number of cells depends on the bounding boxes of the point clouds.
+    num_cells = torch.library.get_ctx().new_dynamic_size()
+    cell_indices = torch.empty((batch_size, num_cells, num_cells, num_cells, 2), dtype=torch.int, device=pts.device)
+    return torch.empty_like(pts), torch.empty_like(batch_ids), torch.empty_like(features), cell_indices
+
+@torch.library.register_fake("pt_mcc::sort_points_step2_grad")
+def _(new_indices, output_grad, output_feature_grad):
+    torch._check(new_indices.dim() == 1 and new_indices.dtype == torch.int32)
+    return torch.empty_like(output_grad), torch.empty_like(output_feature_grad)
 
 @torch.library.register_fake("pt_mcc::sort_features")
 def _(features, indices):
+    torch._check(features.dim() == 2)
+    torch._check(indices.dim() == 1 and indices.dtype == torch.int32)
     return torch.empty_like(features)
 
+@torch.library.register_fake("pt_mcc::sort_features.out")
+def _(features, indices, *, out):
+    torch._check(features.dim() == 2)
+    torch._check(indices.dim() == 1 and indices.dtype == torch.int32)
+    torch._check(out.shape == features.shape)
+    return out
+
 @torch.library.register_fake("pt_mcc::sort_features_back")
 def _(features, indices):
+    torch._check(features.dim() == 2)
+    torch._check(indices.dim() == 1 and indices.dtype == torch.int32)
     return torch.empty_like(features)
 
+@torch.library.register_fake("pt_mcc::sort_features_back_grad")
+def _(indices, output_feature_grad):
+    torch._check(indices.dim() == 1 and indices.dtype == torch.int32)
+    torch._check(output_feature_grad.dim() == 2)
+    return torch.empty_like(output_feature_grad)
+
 @torch.library.register_fake("pt_mcc::transform_indices")
 def _(start_indices, new_indices):
+    torch._check(start_indices.dim() == 1 and start_indices.dtype == torch.int32)
+    torch._check(new_indices.dim() == 1 and new_indices.dtype == torch.int32)
     return torch.empty_like(start_indices)
 
 @torch.library.register_fake("pt_mcc::spatial_conv")
 def _(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg):
     num_samples = in_samples.shape[0]
-    return torch.empty({num_samples, num_out_features})
+    return torch.empty((num_samples, num_out_features), dtype=torch.float, device=in_points.device)
+
+@torch.library.register_fake("pt_mcc::spatial_conv.out")
+def _(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, num_out_features, combin, batch_size, radius, scale_inv, avg, *, out):
+    torch._check(out.dim() == 2 and out.shape[0] == in_samples.shape[0] and out.shape[1] == num_out_features)
+    return out
+
+@torch.library.register_fake("pt_mcc::spatial_conv_grad")
+def _(in_points, in_features, batch_ids, in_pdfs, in_samples, start_index, packed_neigh, in_aabb_min, in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out, in_bias_hidd1, in_bias_hidd2, in_bias_out, in_out_feature_grads, num_out_features, combin, batch_size, radius, scale_inv, avg):
+    return torch.empty_like(in_features), torch.empty_like(in_weights_hidd1), torch.empty_like(in_bias_hidd1), \
+        torch.empty_like(in_weights_hidd2), torch.empty_like(in_bias_hidd2), torch.empty_like(in_weights_out), \
+        torch.empty_like(in_bias_out)
 
 def _backward(ctx, grad):
     a, b = ctx.saved_tensors
@@ -2,10 +2,16 @@ import torch
 from torch.testing._internal.common_utils import TestCase
 from torch.testing._internal.optests import opcheck
 import unittest
+import os
+import sys
+from functools import partial
 import pt_mcc
 from torch import Tensor
 from typing import Tuple
 import torch.nn.functional as F
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+from utils.MCConvBuilder import PointHierarchy, ConvolutionBuilder
 
 
 def reference_muladd(a, b, c):
@@ -13,11 +19,8 @@ def reference_muladd(a, b, c):
 
 class TestMyMulAdd(TestCase):
     def sample_inputs(self, device, *, requires_grad=False):
-        def make_tensor(*size):
-            return torch.randn(size, device=device, requires_grad=requires_grad)
-
-        def make_nondiff_tensor(*size):
-            return torch.randn(size, device=device, requires_grad=False)
+        make_tensor = partial(torch.testing.make_tensor, dtype=torch.float32, device=device, requires_grad=requires_grad)
+        make_nondiff_tensor = partial(torch.testing.make_tensor, dtype=torch.float32, device=device)
 
         return [
             [make_tensor(3), make_tensor(3), 1],
@@ -77,11 +80,7 @@ class TestMyMulAdd(TestCase):
 
 class TestMyAddOut(TestCase):
     def sample_inputs(self, device, *, requires_grad=False):
-        def make_tensor(*size):
-            return torch.randn(size, device=device, requires_grad=requires_grad)
-
-        def make_nondiff_tensor(*size):
-            return torch.randn(size, device=device, requires_grad=False)
+        make_tensor = partial(torch.testing.make_tensor, dtype=torch.float32, device=device, requires_grad=requires_grad)
 
         return [
             [make_tensor(3), make_tensor(3), make_tensor(3)],
@@ -110,6 +109,300 @@ class TestMyAddOut(TestCase):
     def test_opcheck_cuda(self):
         self._opcheck("cuda")
 
+def reference_compute_aabb(pts, batch_ids, batch_size, scale_inv):
+    batch_ids = batch_ids.view(-1).long()
+    aabb_min = torch.stack([pts[batch_ids == b].min(dim=0).values for b in range(batch_size)])
+    aabb_max = torch.stack([pts[batch_ids == b].max(dim=0).values for b in range(batch_size)])
+    if not scale_inv:
+        aabb_min = aabb_min.min(dim=0, keepdim=True).values.expand(batch_size, 3)
+        aabb_max = aabb_max.max(dim=0, keepdim=True).values.expand(batch_size, 3)
+    return aabb_min, aabb_max
+
+class TestComputeAABB(TestCase):
+    def sample_inputs(self, device):
+        def make_batch(num_points, batch_size, scale_inv, shuffle=False, flat=False):
+            pts = torch.randn(num_points * batch_size, 3, device=device)
+            batch_ids = torch.arange(batch_size, device=device, dtype=torch.int32).repeat_interleave(num_points).view(-1, 1)
+            if shuffle:
+                batch_ids = batch_ids[torch.randperm(batch_ids.shape[0], device=device)]
+            if flat:
+                batch_ids = batch_ids.view(-1)
+            return [pts, batch_ids, batch_size, scale_inv]
+
+        return [
+            make_batch(4, 1, True),
+            make_batch(100, 4, True),
+            make_batch(1000, 32, True),
+            make_batch(100, 4, False),
+            make_batch(1000, 8, True, shuffle=True),
+            make_batch(100, 4, True, flat=True),
+        ]
+
+    def _test_correctness(self, device):
+        samples = self.sample_inputs(device)
+        for args in samples:
+            result = pt_mcc.ops.compute_aabb(*args)
+            expected = reference_compute_aabb(*args)
+            torch.testing.assert_close(result, expected)
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_correctness_cuda(self):
+        self._test_correctness("cuda")
+
+    def _test_out(self, device):
+        samples = self.sample_inputs(device)
+        for args in samples:
+            # Reuse buffers filled with garbage to check that they are reset.
+            out = (torch.randn(args[2], 3, device=device), torch.randn(args[2], 3, device=device))
+            result = pt_mcc.ops.compute_aabb(*args, out=out)
+            expected = reference_compute_aabb(*args)
+            self.assertEqual(result[0].data_ptr(), out[0].data_ptr())
+            self.assertEqual(result[1].data_ptr(), out[1].data_ptr())
+            torch.testing.assert_close(out, expected)
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_out_cuda(self):
+        self._test_out("cuda")
+
+    def _opcheck(self, device):
+        # Use opcheck to check that the fake kernel matches the real one
+        samples = self.sample_inputs(device)
+        for args in samples:
+            opcheck(torch.ops.pt_mcc.compute_aabb.default, args)
+            out = (torch.empty(args[2], 3, device=device), torch.empty(args[2], 3, device=device))
+            opcheck(torch.ops.pt_mcc.compute_aabb.out, args, {"aabbMin": out[0], "aabbMax": out[1]})
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_opcheck_cuda(self):
+        self._opcheck("cuda")
+
+
+class TestBuildHierarchyLevel(TestCase):
+    def sample_inputs(self, device):
+        def make_batch(num_points, batch_size, radius, scale_inv):
+            pts = torch.rand(num_points * batch_size, 3, device=device)
+            batch_ids = torch.arange(batch_size, device=device, dtype=torch.int32).repeat_interleave(num_points)
+            aabb_min, aabb_max = pt_mcc.ops.compute_aabb(pts, batch_ids, batch_size, scale_inv)
+            return [pts, batch_ids, aabb_min, aabb_max, radius, batch_size, scale_inv]
+
+        return [
+            make_batch(100, 1, 0.1, True),
+            make_batch(1000, 4, 0.1, True),
+            make_batch(1000, 4, 0.25, False),
+        ]
+
+    def _test_correctness(self, device):
+        samples = self.sample_inputs(device)
+        for args in samples:
+            pts, batch_ids = args[0], args[1]
+            sampled_pts, sampled_batch_ids, indices = pt_mcc.ops.build_hierarchy_level(*args)
+            # The sampled points are a subset of the input points.
+            self.assertEqual(indices.unique().numel(), indices.numel())
+            torch.testing.assert_close(sampled_pts, pts[indices.long()])
+            torch.testing.assert_close(sampled_batch_ids, batch_ids[indices.long()])
+            # All the models keep at least one point.
+            self.assertEqual(sampled_batch_ids.unique().numel(), args[5])
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_correctness_cuda(self):
+        self._test_correctness("cuda")
+
+    def _opcheck(self, device):
+        # Use opcheck to check that the fake kernel matches the real one
+        samples = self.sample_inputs(device)
+        for args in samples:
+            opcheck(torch.ops.pt_mcc.build_hierarchy_level.default, args,
+                test_utils=("test_schema", "test_faketensor"))
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_opcheck_cuda(self):
+        self._opcheck("cuda")
+
+
+class TestBuildHierarchy(TestCase):
+    def sample_inputs(self, device):
+        def make_batch(num_points, batch_size, radii, scale_inv):
+            pts = torch.rand(num_points * batch_size, 3, device=device)
+            batch_ids = torch.arange(batch_size, device=device, dtype=torch.int32).repeat_interleave(num_points)
+            aabb_min, aabb_max = pt_mcc.ops.compute_aabb(pts, batch_ids, batch_size, scale_inv)
+            return [pts, batch_ids, aabb_min, aabb_max, radii, batch_size, scale_inv]
+
+        return [
+            make_batch(100, 1, [], True),
+            make_batch(1000, 4, [0.1, 0.4], True),
+            make_batch(1000, 4, [0.1, 0.2, 0.4], False),
+        ]
+
+    def _test_correctness(self, device):
+        samples = self.sample_inputs(device)
+        for args in samples:
+            pts, batch_ids, aabb_min, aabb_max, radii, batch_size, scale_inv = args
+            level_pts, level_batch_ids, level_indices = pt_mcc.ops.build_hierarchy(*args)
+            self.assertEqual(len(level_pts), len(radii))
+            # Each level selects the same points as computing the levels one by one. The
+            # order of the selected points is not deterministic.
+            for radius, sampled_pts, sampled_batch_ids, indices in zip(
+                radii, level_pts, level_batch_ids, level_indices):
+                expected_indices = pt_mcc.ops.build_hierarchy_level(
+                    pts, batch_ids, aabb_min, aabb_max, radius, batch_size, scale_inv)[2]
+                torch.testing.assert_close(indices.sort()[0], expected_indices.sort()[0])
+                torch.testing.assert_close(sampled_pts, pts[indices.long()])
+                torch.testing.assert_close(sampled_batch_ids, batch_ids[indices.long()])
+                pts, batch_ids = sampled_pts, sampled_batch_ids
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_correctness_cuda(self):
+        self._test_correctness("cuda")
+
+    def _opcheck(self, device):
+        # Use opcheck to check that the fake kernel matches the real one
+        samples = self.sample_inputs(device)
+        for args in samples:
+            opcheck(torch.ops.pt_mcc.build_hierarchy.default, args,
+                test_utils=("test_schema", "test_faketensor"))
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_opcheck_cuda(self):
+        self._opcheck("cuda")
+
+
+class TestGetSampledFeatures(TestCase):
+    def sample_inputs(self, device, *, requires_grad=False):
+        def make_sample(num_points, num_features, num_samples):
+            features = torch.randn(num_points, num_features, device=device, requires_grad=requires_grad)
+            # Indices with repetitions and points that are never sampled.
+            indices = torch.randint(0, num_points, (num_samples,), device=device, dtype=torch.int32)
+            return [indices, features]
+
+        return [
+            make_sample(10, 1, 5),
+            make_sample(100, 8, 200),
+            make_sample(1000, 3, 250),
+        ]
+
+    def _test_gradients(self, device):
+        samples = self.sample_inputs(device, requires_grad=True)
+        for args in samples:
+            indices, features = args
+            result = pt_mcc.ops.get_sampled_features(indices, features)
+            expected = features.index_select(0, indices)
+            torch.testing.assert_close(result, expected)
+
+            grad = torch.randn_like(result)
+            result_grad, = torch.autograd.grad(result, features, grad)
+            expected_grad, = torch.autograd.grad(expected, features, grad)
+            torch.testing.assert_close(result_grad, expected_grad)
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_gradients_cuda(self):
+        self._test_gradients("cuda")
+
+
+class TestSortFeatures(TestCase):
+    def sample_inputs(self, device):
+        def make_sample(num_points, num_features):
+            features = torch.randn(num_points, num_features, device=device)
+            indices = torch.randperm(num_points, device=device).int()
+            return [features, indices]
+
+        return [
+            make_sample(10, 1),
+            make_sample(1000, 16),
+        ]
+
+    def _test_out(self, device):
+        samples = self.sample_inputs(device)
+        for args in samples:
+            expected = pt_mcc.ops.sort_features(*args)
+            out = torch.empty_like(args[0])
+            result = pt_mcc.ops.sort_features(*args, out=out)
+            self.assertTrue(result is out)
+            torch.testing.assert_close(out, expected)
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_out_cuda(self):
+        self._test_out("cuda")
+
+    def _opcheck(self, device):
+        # Use opcheck to check that the fake kernel matches the real one
+        samples = self.sample_inputs(device)
+        for args in samples:
+            opcheck(torch.ops.pt_mcc.sort_features.out, args, {"out": torch.empty_like(args[0])},
+                test_utils=("test_schema", "test_faketensor"))
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_opcheck_cuda(self):
+        self._opcheck("cuda")
+
+
+class TestConvolutionBuilder(TestCase):
+    def sample_inputs(self, device):
+        num_points, batch_size = 500, 4
+        pts = torch.rand(num_points * batch_size, 3, device=device)
+        batch_ids = torch.arange(batch_size, device=device, dtype=torch.int32).repeat_interleave(num_points)
+        features = torch.randn(num_points * batch_size, 4, device=device, requires_grad=True)
+        return pts, batch_ids, features, batch_size
+
+    def reference_conv(self, builder, hierarchy, features):
+        # Compute the convolution with the operations on the current stream, using
+        # copies of the parameters of the builder.
+        in_level = hierarchy.levels_[builder.inPointLevel]
+        out_level = hierarchy.levels_[builder.outPointLevel]
+        aabb_min, aabb_max = hierarchy.aabbMin_, hierarchy.aabbMax_
+        batch_size, radius, scale_inv = hierarchy.batchSize_, builder.convRadius, builder.relativeRadius_
+        params = {name: getattr(builder, name).detach().clone().requires_grad_()
+            for name in ConvolutionBuilder.PARAM_NAMES}
+
+        keys, indices = pt_mcc.ops.sort_points_step1(in_level.points, in_level.batchIds,
+            aabb_min, aabb_max, batch_size, radius, scale_inv)
+        sort_pts, sort_batch_ids, sort_features, cell_indices = pt_mcc.ops.sort_points_step2(
+            in_level.points, in_level.batchIds, features, keys, indices,
+            aabb_min, aabb_max, batch_size, radius, scale_inv)
+        start_indices, packed_neighs = pt_mcc.ops.find_neighbors(out_level.points, out_level.batchIds,
+            sort_pts, cell_indices, aabb_min, aabb_max, radius, batch_size, scale_inv)
+        pdfs = pt_mcc.ops.compute_pdf(sort_pts, sort_batch_ids, aabb_min, aabb_max,
+            start_indices, packed_neighs, builder.KDEWindow_, radius, batch_size, scale_inv)
+        result = pt_mcc.ops.spatial_conv(sort_pts, sort_features, sort_batch_ids, pdfs, out_level.points,
+            start_indices, packed_neighs, aabb_min, aabb_max,
+            params['weights'], params['weights2'], params['weights3'],
+            params['biases'], params['biases2'], params['biases3'],
+            builder.outNumFeatures, builder.multiFeatureConvs_, batch_size, radius,
+            scale_inv, builder.useAVG_)
+        return result, params
+
+    def _test_correctness(self, device):
+        pts, batch_ids, features, batch_size = self.sample_inputs(device)
+        builder = ConvolutionBuilder(KDEWindow=0.2, inPointLevel=0, outPointLevel=1, inNumFeatures=4,
+            outNumFeatures=8, convRadius=0.2, multiFeatureConvs=True, usePDF=True).to(device)
+
+        # The hierarchy is computed on a side stream and used right away by the builder.
+        hierarchy = PointHierarchy(pts, features, batch_ids, [0.1], "Test_PH", batch_size)
+        result = builder(hierarchy, features)
+        grad = torch.randn_like(result)
+        result.backward(grad)
+        # The second call reuses the cached tensors of the hierarchy.
+        self.assertEqual(len(hierarchy.cacheGrids_), 1)
+        self.assertEqual(len(hierarchy.cacheNeighs_), 1)
+        self.assertEqual(len(hierarchy.cachePDFs_), 1)
+        torch.testing.assert_close(builder(hierarchy, features), result, rtol=1e-4, atol=1e-4)
+
+        torch.cuda.synchronize()
+        ref_features = features.detach().clone().requires_grad_()
+        expected, params = self.reference_conv(builder, hierarchy, ref_features)
+        expected.backward(grad)
+
+        # The kernels accumulate with atomics, so the order of the sums is not deterministic.
+        torch.testing.assert_close(result, expected, rtol=1e-4, atol=1e-4)
+        torch.testing.assert_close(features.grad, ref_features.grad, rtol=1e-4, atol=1e-4)
+        # The gradients of the parameters are stored in the packed parameter.
+        expected_param_grads = torch.cat([params[name].grad.reshape(-1)
+            for name in ConvolutionBuilder.PARAM_NAMES])
+        torch.testing.assert_close(builder.packedParams.grad, expected_param_grads, rtol=1e-4, atol=1e-4)
+
+    @unittest.skipIf(not torch.cuda.is_available(), "requires cuda")
+    def test_correctness_cuda(self):
+        self._test_correctness("cuda")
+
 
 if __name__ == "__main__":
     print('##################### Test compute_aabb #####################')
@@ -346,23 +639,14 @@ if __name__ == "__main__":
 
     in_bias_out = torch.tensor([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8], device='cuda', dtype=torch.float32).requires_grad_()
 
-
-    # Scalar tensors
-    num_out_features_tensor = torch.tensor(num_out_features, device='cuda', dtype=torch.int64)
-    combin_tensor = torch.tensor(True, device='cuda', dtype=torch.bool)  # Example with combin=True
-    batch_size_tensor = torch.tensor(batch_size, device='cuda', dtype=torch.int64)
-    radius_tensor = torch.tensor(radius, device='cuda', dtype=torch.float64)
-    scale_inv_tensor = torch.tensor(True, device='cuda', dtype=torch.bool)
-    avg_tensor = torch.tensor(True, device='cuda', dtype=torch.bool)
-
     # Call the function
     output = pt_mcc.ops.spatial_conv(
         in_points, in_features, batch_ids, in_pdfs,
         in_samples, start_index, packed_neigh, in_aabb_min,
         in_aabb_max, in_weights_hidd1, in_weights_hidd2, in_weights_out,
         in_bias_hidd1, in_bias_hidd2, in_bias_out,
-        num_out_features_tensor, combin_tensor, batch_size_tensor, radius_tensor,
-        scale_inv_tensor, avg_tensor
+        num_out_features, True, batch_size, radius,
+        True, True
     )
     
     print("Output shape:", output.shape)  # Expected shape: (num_samples, num_out_features)
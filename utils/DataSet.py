@@ -730,15 +730,12 @@ class DataSet(with_metaclass(abc.ABCMeta)):
             accumPaths (array of strings): List of paths to the models used in the batch.
         """
 
-        accumPts = np.array([])
-        accumBatchIds = np.array([])
-        accumFeatures = np.array([])
-        accumLabels = None
-        if self.pointLabels_:
-            accumLabels = np.array([])
-        accumCat = None
-        if self.useCategories_:
-            accumCat = np.array([])
+        # The arrays of each model are stored in lists and concatenated once at the end.
+        accumPts = []
+        accumBatchIds = []
+        accumFeatures = []
+        accumLabels = []
+        accumCat = []
         accumPaths = []
         
         numModelInBatch = 0
@@ -813,22 +810,19 @@ class DataSet(with_metaclass(abc.ABCMeta)):
                                     self.augmentSmallRotations_, rotationMatrix)
 
                     # Append the current model to the batch.         
-                    accumPts = np.concatenate((accumPts, currPts), axis=0) if accumPts.size else currPts
-                    auxBatchIds = np.array([[i] for it in range(len(currPts))])
-                    accumBatchIds = np.concatenate((accumBatchIds, auxBatchIds), axis=0) if accumBatchIds.size else auxBatchIds
+                    accumPts.append(currPts)
+                    accumBatchIds.append(np.full((len(currPts), 1), i, dtype=int))
                     if self.pointFeatures_:
-                        accumFeatures = np.concatenate((accumFeatures, currFeatures), axis=0) if accumFeatures.size else currFeatures
+                        accumFeatures.append(currFeatures)
                     else:
-                        auxFeatures = np.array([[1.0] for it in range(len(currPts))])
-                        accumFeatures = np.concatenate((accumFeatures, auxFeatures), axis=0) if accumFeatures.size else auxFeatures
+                        accumFeatures.append(np.ones((len(currPts), 1)))
                     if self.pointLabels_:
-                        accumLabels = np.concatenate((accumLabels, currLabels), axis=0) if accumLabels.size else currLabels
+                        accumLabels.append(currLabels)
                     if self.useCategories_:
                         if self.pointCategories_:
-                            auxCategories =  np.array([[currModelCat] for it in range(len(currPts))])
-                            accumCat = np.concatenate((accumCat,auxCategories), axis=0) if accumCat.size else auxCategories
+                            accumCat.append(np.full((len(currPts), 1), currModelCat))
                         else:
-                            accumCat = np.concatenate((accumCat, np.array([currModelCat])), axis=0) if accumCat.size else np.array([currModelCat])
+                            accumCat.append(np.array([currModelCat]))
                     accumPaths.append(currModel)
                                 
                     # Update the counters and the iterator.
@@ -839,5 +833,14 @@ class DataSet(with_metaclass(abc.ABCMeta)):
             
         if repeatModelInBatch:
             self.iterator_ += 1
+
+        def concatenate_list(arrays):
+            return np.concatenate(arrays, axis=0) if len(arrays) > 0 else np.array([])
+
+        accumPts = concatenate_list(accumPts)
+        accumBatchIds = concatenate_list(accumBatchIds)
+        accumFeatures = concatenate_list(accumFeatures)
+        accumLabels = concatenate_list(accumLabels) if self.pointLabels_ else None
+        accumCat = concatenate_list(accumCat) if self.useCategories_ else None
             
         return numModelInBatch, accumPts, accumBatchIds, accumFeatures, accumLabels, accumCat, accumPaths
\ No newline at end of file
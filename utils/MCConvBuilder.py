@@ -13,36 +13,55 @@
 import sys
 import os
 import math
+import contextlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
 import torch
 import torch.nn as nn
 import torch.nn.init as init
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.dirname(BASE_DIR)
 sys.path.append(os.path.join(ROOT_DIR, 'tf_ops'))
-from pt_mcc.ops import compute_aabb, sort_points_step1, sort_points_step2, sort_features, sort_features_back, \
-    compute_pdf, poisson_sampling, get_sampled_features, spatial_conv, get_block_size, transform_indices, find_neighbors
+from pt_mcc.ops import compute_aabb, sort_points_step1, sort_points_step2, sort_features, \
+    compute_pdf, build_hierarchy, spatial_conv, get_block_size, find_neighbors
+
+logger = logging.getLogger(__name__)
+
+# Device where the parameters of the convolutions are created.
+_MCC_DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Number of neurons processed by each block of the convolution kernels. It is a
+# compile-time constant of the extension.
+_BLOCK_SIZE = get_block_size()
+
+
+@dataclass(frozen=True)
+class Level:
+    """Class to store a level of a point hierarchy.
+
+    Attributes:
+        points (nx3 tensor): Point positions.
+        features (nxm tensor): Point features.
+        batchIds (n or nx1 tensor): Point batch ids.
+        sampledIndexs (n tensor): Indexs of the points in the previous level of the
+            hierarchy, or None for the input point cloud.
+        radius (float): Poisson Disk radius used to compute the level, 0.0 for the
+            input point cloud.
+    """
+    points: torch.Tensor
+    features: torch.Tensor
+    batchIds: torch.Tensor
+    sampledIndexs: Optional[torch.Tensor]
+    radius: float
 
 
 class PointHierarchy:
     """Class to compute and store a point hierarchy based on a given input point cloud.
 
     Attributes:
-        points_ (list of nx3 tensors): List of point tensors. Each tensor correspond to
-            a different level of the hierarchy, being the position 0 the input point cloud
-            and the last level the coarse level of the hierarchy.
-        features_ (list of nxm tensors): List of point feature tensor. Each tensor correspond
-            to the point features of a different level of the hierarchy, following the same
-            orther as the points_ list.
-        batchIds_ (list of nx1 tensors): List of point batch ids tensor. Each tensor correspond
-            to the point batch ids of a different level of the hierarchy, following the same
-            orther as the points_ list.
-        sampledIndexs_ (list of nx1 tensors): List of point indexs tensor. Each tensor correspond
-            to the point indexs used to compute the next level of the hierarchy. This list follows
-            the same orther as the points_list, however, this list has one element less since the 
-            last level of the hierarchy was not used to compute another level.
-        radiusList_ (list of float): List of Poisson Disk radius corresponding to each level of the
-            hierarchy. Since the first level of the hierarchy is the input point cloud, the first
-            element of the list is the 0.0.
+        levels_ (list of Level): Levels of the hierarchy, being the position 0 the input
+            point cloud and the last level the coarse level of the hierarchy.
         batchSize_ (int): Batch size used during computations.
         relativeRadius_ (bool): Boolean that indicates if the Poisson Disk radii are relative to 
             the bounding box of the point cloud.
@@ -52,6 +71,15 @@ class PointHierarchy:
             cloud in the batch.
         aabbMax_ (batchSize_x3 tensor): List of maximum points of the bounding boxes for each point 
             cloud in the batch.
+        readyEvent_ (torch.cuda.Event): Event recorded when the hierarchy has been computed on
+            its side stream, or None if the hierarchy was computed on the cpu.
+        cacheGrids_ (dictionary of tuples (sortPts, sortBatchs, cellIndexs, indexs)): Cache
+            of the resulting tensors of distributing points into a regular grid of a specific
+            cell size.
+        cacheNeighs_ (dictionary of tuples (startIndexs, packedNeighs)): Cache of the resulting
+            tensors of computing the neighboring point for a given convolution.
+        cachePDFs_ (dictionary of tensors): Cache of the resulting tensor of computing the PDF
+            values for a list of neighboring points.
     """
 
     def __init__(self, 
@@ -64,7 +92,7 @@ class PointHierarchy:
         Args:
             inPoints (nx3 tensor): Input point positions.
             inFeatures (nxm tensor): Input point features.
-            inBatchIds (nx1 tensor): Input point batch ids.
+            inBatchIds (n or nx1 tensor): Input point batch ids.
             radiusList (float array): List of radius used to compute the different 
                 levels of the hierarchy.
             hierarchyName (string): Name of the point hierarchy.
@@ -74,64 +102,75 @@ class PointHierarchy:
         """
 
         # Initialize the class variables.
-        self.points_ = [inPoints]
-        self.features_ =[inFeatures]
-        self.batchIds_ = [inBatchIds]
-        self.sampledIndexs_ = []
-        self.radiusList_ = [0.0]
+        self.levels_ = [Level(inPoints, inFeatures, inBatchIds, None, 0.0)]
         self.batchSize_ = batchSize
         self.relativeRadius_ = relativeRadius
         self.hierarchyName_ = hierarchyName        
 
-        # Compute the point cloud bounding box.
-        aabbMin, aabbMax = compute_aabb(inPoints, inBatchIds, 
-            batchSize, self.relativeRadius_)
-        self.aabbMin_ = aabbMin
-        self.aabbMax_ = aabbMax
-
-        # print("")
-        # print("########## Point Hierarchy: "+hierarchyName+" (Rel: "+str(relativeRadius)+")")
-        # print("")
-        # print("Level: 0 | Poisson Disk Radius: 0.0")
-
-        # Initialize the temporal variables.
-        currPts = inPoints
-        currFeatures = inFeatures
-        currBatchIds = inBatchIds
-
-        # Compute the different levels.
-        for level, currRadius in enumerate(radiusList):
-
-            # print("Level: "+str(level+1)+" | Poisson Disk Radius: "+str(currRadius))
-
-            # Distribute points into a regular grid.
-            keys, indexs = sort_points_step1(currPts, currBatchIds, self.aabbMin_, 
-                self.aabbMax_, self.batchSize_, currRadius, self.relativeRadius_)
-            
-            sortPts, sortBatchs, sortFeatures, cellIndexs = sort_points_step2(currPts, 
-                currBatchIds, currFeatures, keys, indexs, self.aabbMin_, self.aabbMax_, 
-                self.batchSize_, currRadius, self.relativeRadius_)
-
-            # Use poisson disk sampling algorithm for the given radius.
-            sampledPts, sampledBatchsIds, sampledIndexs = poisson_sampling(
-                sortPts, sortBatchs, cellIndexs, aabbMin, aabbMax, currRadius, batchSize, self.relativeRadius_)
-            sampledFeatures = get_sampled_features(sampledIndexs, sortFeatures)
-            transformedIndexs = transform_indices(sampledIndexs, indexs)
-
-            # Save the resulting point cloud.
-            self.points_.append(sampledPts)
-            self.batchIds_.append(sampledBatchsIds)
-            self.features_.append(sampledFeatures)
-            self.sampledIndexs_.append(transformedIndexs)
-            self.radiusList_.append(currRadius)
-
-            # Update temporal variables.
-            currPts = sampledPts
-            currBatchIds = sampledBatchsIds
-            currFeatures = sampledFeatures
-            
-
-        # print("")
+        # Initialize the caches of the convolutions. They are shared by all the convolutions
+        # that use the hierarchy, and they are released together with it.
+        self.reset()
+
+        # The hierarchy is computed on a side stream, so the host can keep preparing the
+        # next batch while the kernels run. The side stream waits for the work that
+        # produced the inputs, and the consumers wait for readyEvent_.
+        self.readyEvent_ = None
+        if inPoints.is_cuda:
+            currentStream = torch.cuda.current_stream(inPoints.device)
+            sideStream = torch.cuda.Stream(inPoints.device)
+            sideStream.wait_stream(currentStream)
+            for tensor in (inPoints, inFeatures, inBatchIds):
+                tensor.record_stream(sideStream)
+            streamContext = torch.cuda.stream(sideStream)
+        else:
+            streamContext = contextlib.nullcontext()
+
+        with streamContext:
+            # Compute the point cloud bounding box. The hierarchy is not differentiable,
+            # only the features are gathered with autograd enabled.
+            with torch.no_grad():
+                aabbMin, aabbMax = compute_aabb(inPoints, inBatchIds, 
+                    batchSize, self.relativeRadius_)
+            self.aabbMin_ = aabbMin
+            self.aabbMax_ = aabbMax
+
+            # print("")
+            # print("########## Point Hierarchy: "+hierarchyName+" (Rel: "+str(relativeRadius)+")")
+            # print("")
+            # print("Level: 0 | Poisson Disk Radius: 0.0")
+
+            # Distribute points into a regular grid and use poisson disk sampling 
+            # algorithm for each radius. All the levels are computed by a single operation.
+            with torch.no_grad():
+                levelPts, levelBatchIds, levelIndexs = build_hierarchy(
+                    inPoints, inBatchIds, self.aabbMin_, self.aabbMax_, 
+                    [float(currRadius) for currRadius in radiusList], 
+                    self.batchSize_, self.relativeRadius_)
+
+            # Gather the features of each level and save the resulting point clouds.
+            currFeatures = inFeatures
+            for sampledPts, sampledBatchsIds, transformedIndexs, currRadius in zip(
+                levelPts, levelBatchIds, levelIndexs, radiusList):
+                currFeatures = currFeatures.index_select(0, transformedIndexs)
+                self.levels_.append(Level(sampledPts, currFeatures, sampledBatchsIds, 
+                    transformedIndexs, currRadius))
+
+        if inPoints.is_cuda:
+            self.readyEvent_ = sideStream.record_event()
+            # The tensors are used on the current stream once the event is reached.
+            for currLevel in self.levels_[1:]:
+                for tensor in (currLevel.points, currLevel.features, currLevel.batchIds,
+                    currLevel.sampledIndexs):
+                    tensor.record_stream(currentStream)
+            self.aabbMin_.record_stream(currentStream)
+            self.aabbMax_.record_stream(currentStream)
+
+    def reset(self):
+        """Method to reset the cache of operations.
+        """
+        self.cacheGrids_ = {}
+        self.cacheNeighs_ = {}
+        self.cachePDFs_ = {}
 
 
 class ConvolutionBuilder (nn.Module):
@@ -151,15 +190,14 @@ class ConvolutionBuilder (nn.Module):
         useAVG_ (bool): Boolean that indicates if the convolution result is divided by
             the number of neighbors.
         decayLossCollection_ (string): Weight decay loss collection name.
-        cacheGrids_ (dictionary of tuples (sortPts, sortBatchs, cellIndexs, indexs)): Cache
-            of the resulting tensors of distributing points into a regular grid of a specific
-            cell size.
-        cacheNeighs_ (dictionary of tuples (startIndexs, packedNeighs)): Cache of the resulting
-            tensors of computing the neighboring point for a given convolution.
-        cachePDFs_ (dictionary of tensors): Cache of the resulting tensor of computing the PDF
-            values for a list of neighboring points.
+        packedParams (Parameter): Storage of all the weights and biases of the convolution.
+            The weights and biases are accessed as views into this storage.
+        paramLayout_ (dictionary of tuples (offset, shape)): Position and shape of each
+            weight and bias tensor within packedParams.
     """
 
+    PARAM_NAMES = ('weights', 'biases', 'weights2', 'biases2', 'weights3', 'biases3')
+
     def __init__(self, 
         KDEWindow = 0.25,
         convName='',
@@ -194,10 +232,6 @@ class ConvolutionBuilder (nn.Module):
             decayLossCollection (string): Weight decay loss collection name.
         """
         super().__init__()
-        # Initialize the caches.
-        self.cacheGrids_ = {}
-        self.cacheNeighs_ = {}
-        self.cachePDFs_ = {}
 
         # Store the attributes.
         self.inPointLevel = inPointLevel
@@ -213,11 +247,8 @@ class ConvolutionBuilder (nn.Module):
         self.useAVG_ = useAVG
         self.decayLossCollection_ = decayLossCollection
 
-        print("########## Convolution Builder")
-        print("")
-
         # Create the convolution.
-        blockSize = get_block_size()
+        blockSize = _BLOCK_SIZE
         
         if multiFeatureConvs:
             numOutNeurons = inNumFeatures * outNumFeatures
@@ -226,26 +257,84 @@ class ConvolutionBuilder (nn.Module):
 
         numBlocks = (numOutNeurons + blockSize - 1) // blockSize  # Equivalent to ceil(numOutNeurons / blockSize)
 
-        print("Convolution: "+str(convName)+" (KDE: "+str(self.KDEWindow_)+" | MF: "+str(self.multiFeatureConvs_)+
-            " | Rel: "+str(self.relativeRadius_)+" | PDF: "+str(self.usePDF_)+")")
-        print("    In points: "+str(self.inPointLevel))
-        print("    Out points: "+str(self.outPointLevel))
-        print("    Features in: "+str(inNumFeatures))
-        print("    Features out: "+str(self.outNumFeatures))
-        print("    Radius: "+str(self.convRadius))
-
-         # Initialize weights and biases
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.weights = nn.Parameter(torch.empty(3, blockSize * numBlocks, device=device))
-        self.biases = nn.Parameter(torch.zeros(blockSize * numBlocks, device=device))
-        self.weights2 = nn.Parameter(torch.empty(blockSize, numBlocks * blockSize, device=device))
-        self.biases2 = nn.Parameter(torch.zeros(numBlocks * blockSize, device=device))
-        self.weights3 = nn.Parameter(torch.empty(blockSize, numBlocks * blockSize, device=device))
-        self.biases3 = nn.Parameter(torch.zeros(numBlocks * blockSize, device=device))
+        logger.debug("Convolution: %s (KDE: %s | MF: %s | Rel: %s | PDF: %s)", convName, 
+            self.KDEWindow_, self.multiFeatureConvs_, self.relativeRadius_, self.usePDF_)
+        logger.debug("    In points: %s", self.inPointLevel)
+        logger.debug("    Out points: %s", self.outPointLevel)
+        logger.debug("    Features in: %s", inNumFeatures)
+        logger.debug("    Features out: %s", self.outNumFeatures)
+        logger.debug("    Radius: %s", self.convRadius)
+
+        # Initialize weights and biases. All of them are stored in a single tensor, so
+        # they are allocated at once and updated by the optimizer as a single parameter.
+        numNeurons = blockSize * numBlocks
+        paramShapes = {
+            'weights': (3, numNeurons),
+            'biases': (numNeurons,),
+            'weights2': (blockSize, numNeurons),
+            'biases2': (numNeurons,),
+            'weights3': (blockSize, numNeurons),
+            'biases3': (numNeurons,)}
+        self.paramLayout_ = {}
+        offset = 0
+        for name in self.PARAM_NAMES:
+            self.paramLayout_[name] = (offset, paramShapes[name])
+            offset += math.prod(paramShapes[name])
+        self.packedParams = nn.Parameter(torch.empty(offset, device=_MCC_DEVICE))
 
         init.xavier_normal_(self.weights)
         init.xavier_normal_(self.weights2)
         init.xavier_normal_(self.weights3)
+        init.zeros_(self.biases)
+        init.zeros_(self.biases2)
+        init.zeros_(self.biases3)
+
+    def __param_view__(self, name):
+        """Method to get a weight or bias tensor as a view of the packed parameters.
+
+        Args:
+            name (string): Name of the tensor.
+
+        Returns:
+            tensor: View of the tensor within packedParams.
+        """
+        offset, shape = self.paramLayout_[name]
+        return self.packedParams.narrow(0, offset, math.prod(shape)).view(shape)
+
+    @property
+    def weights(self):
+        return self.__param_view__('weights')
+
+    @property
+    def biases(self):
+        return self.__param_view__('biases')
+
+    @property
+    def weights2(self):
+        return self.__param_view__('weights2')
+
+    @property
+    def biases2(self):
+        return self.__param_view__('biases2')
+
+    @property
+    def weights3(self):
+        return self.__param_view__('weights3')
+
+    @property
+    def biases3(self):
+        return self.__param_view__('biases3')
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        """Method to load the parameters of the module. Checkpoints stored before the
+        parameters were packed contain one entry per weight and bias tensor, which are
+        concatenated into the packedParams entry.
+        """
+        oldKeys = [prefix + name for name in self.PARAM_NAMES]
+        if all(key in state_dict for key in oldKeys):
+            state_dict[prefix + 'packedParams'] = torch.cat(
+                [state_dict.pop(key).reshape(-1) for key in oldKeys])
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
     def __compute_dic_keys__(self,
         inPointHierarchy, outPointHierarchy,
@@ -269,38 +358,33 @@ class ConvolutionBuilder (nn.Module):
                 be used during computations.
 
         Returns:
-            string: Dictionary key for the grid operations.
-            string: Dictionary key for the find neighbors operation.
-            string: Dictionary key for the compute pdfs operation.
+            tuple: Dictionary key for the grid operations.
+            tuple: Dictionary key for the find neighbors operation.
+            tuple: Dictionary key for the compute pdfs operation.
         """
         
-        keyGrid = inPointHierarchy.hierarchyName_ + '|' + str(inPointLevel) + '|' \
-            + str(convRadius) + '|' + str(relativeRadius)
+        keyGrid = (inPointHierarchy.hierarchyName_, inPointLevel, convRadius, relativeRadius)
 
-        keyNeighs = keyGrid + '|' + outPointHierarchy.hierarchyName_ + '|' \
-            + str(outPointLevel) 
+        keyNeighs = keyGrid + (outPointHierarchy.hierarchyName_, outPointLevel)
 
-        keyPDF = keyNeighs + '|' + str(KDEWindow) + '|' + str(usePDF)
+        keyPDF = keyNeighs + (KDEWindow, usePDF)
         
         return keyGrid, keyNeighs, keyPDF
 
 
-    def reset(self):
-        """Method to reset the cache of operations.
-        """
-        self.cacheGrids_ = {}
-        self.cacheNeighs_ = {}
-        self.cachePDFs_ = {}
-
     
+    # The custom operations only support single precision, so autocast is disabled
+    # within the convolution and the input features are casted to float32.
+    @torch.amp.custom_fwd(device_type='cuda', cast_inputs=torch.float32)
     def forward(self,
         inPointHierarchy, 
         inFeatures):
         """Method to create a convolution layer. 
         
-        This method uses a cache to store the operations to distribute points into a regular 
-        grid, to find the neighboring points, and to compute the PDF values of the points. 
-        By doing so, the builder avoids repeated computations in the final network architectures. 
+        This method uses the caches of the input point hierarchy to store the operations to 
+        distribute points into a regular grid, to find the neighboring points, and to compute 
+        the PDF values of the points. By doing so, the convolutions on the same hierarchy avoid 
+        repeated computations in the final network architectures. 
         
         For some of the parameters (the ones with default value None) the default values 
         defined when create the class are used if no value is provided when the function is called.
@@ -339,11 +423,13 @@ class ConvolutionBuilder (nn.Module):
         currUseAVG = self.useAVG_
         currOutPointHierarchy = inPointHierarchy
         currOutPointLevel = self.outPointLevel
-
-
-        # Check if the batch size in both point hierarchies are the same.
-        if currOutPointHierarchy.batchSize_ != inPointHierarchy.batchSize_:
-            raise RuntimeError('Different batch size in the input and output point hierarchy')
+        if inPointHierarchy.readyEvent_ is not None:
+            torch.cuda.current_stream().wait_event(inPointHierarchy.readyEvent_)
+        inLevel = inPointHierarchy.levels_[self.inPointLevel]
+        outLevel = currOutPointHierarchy.levels_[currOutPointLevel]
+        aabbMin = inPointHierarchy.aabbMin_
+        aabbMax = inPointHierarchy.aabbMax_
+        batchSize = inPointHierarchy.batchSize_
 
         # Check if the num input features is equal to the number of output features 
         # when multifeatureCon is False
@@ -357,65 +443,48 @@ class ConvolutionBuilder (nn.Module):
 
         
         # Check if the grid distribution was already computed.
-        if keyGrid in self.cacheGrids_:
-            currGridTuple = self.cacheGrids_[keyGrid]
+        if keyGrid in inPointHierarchy.cacheGrids_:
+            currGridTuple = inPointHierarchy.cacheGrids_[keyGrid]
             sortFeatures = sort_features(inFeatures, currGridTuple[3])
         else:
-            keys, indexs = sort_points_step1(inPointHierarchy.points_[self.inPointLevel], 
-                inPointHierarchy.batchIds_[self.inPointLevel], inPointHierarchy.aabbMin_, 
-                inPointHierarchy.aabbMax_, inPointHierarchy.batchSize_, 
+            keys, indexs = sort_points_step1(inLevel.points, inLevel.batchIds, aabbMin, aabbMax, batchSize, 
                 self.convRadius, currRelativeRadius)
 
             sortPts, sortBatchs, sortFeatures, cellIndexs = sort_points_step2(
-                inPointHierarchy.points_[self.inPointLevel], 
-                inPointHierarchy.batchIds_[self.inPointLevel], inFeatures, keys, indexs, 
-                inPointHierarchy.aabbMin_, inPointHierarchy.aabbMax_, 
-                inPointHierarchy.batchSize_, self.convRadius, currRelativeRadius)
+                inLevel.points, inLevel.batchIds, inFeatures, keys, indexs, 
+                aabbMin, aabbMax, batchSize, self.convRadius, currRelativeRadius)
             currGridTuple = (sortPts, sortBatchs, cellIndexs, indexs)
-            #self.cacheGrids_[keyGrid] = currGridTuple
+            inPointHierarchy.cacheGrids_[keyGrid] = currGridTuple
 
         # Check if the neighbor information was previously computed.
-        if keyNeighs in self.cacheNeighs_:
-            currNeighTuple = self.cacheNeighs_[keyNeighs]
-            print('use neighbor cache')
+        if keyNeighs in inPointHierarchy.cacheNeighs_:
+            currNeighTuple = inPointHierarchy.cacheNeighs_[keyNeighs]
         else:
             startIndexs, packedNeighs = find_neighbors(
-                currOutPointHierarchy.points_[currOutPointLevel], 
-                currOutPointHierarchy.batchIds_[currOutPointLevel], 
-                currGridTuple[0], currGridTuple[2], inPointHierarchy.aabbMin_, 
-                inPointHierarchy.aabbMax_, self.convRadius, inPointHierarchy.batchSize_, 
-                currRelativeRadius)
+                outLevel.points, outLevel.batchIds, 
+                currGridTuple[0], currGridTuple[2], aabbMin, aabbMax, 
+                self.convRadius, batchSize, currRelativeRadius)
             currNeighTuple = (startIndexs, packedNeighs)
-            #self.cacheNeighs_[keyNeighs] = currNeighTuple
-
-        # Check if the pdf was previously computed.
-        if keyPDF in self.cachePDFs_:
-            currPDFs = self.cachePDFs_[keyPDF]
+            inPointHierarchy.cacheNeighs_[keyNeighs] = currNeighTuple
+
+        # Check if the pdf was previously computed. Without pdf the convolution does not 
+        # weight the neighbors by their density.
+        if not currUsePDF:
+            currPDFs = None
+        elif keyPDF in inPointHierarchy.cachePDFs_:
+            currPDFs = inPointHierarchy.cachePDFs_[keyPDF]
         else:
-            if currUsePDF:
-                with torch.no_grad():
-                    currPDFs = compute_pdf(currGridTuple[0], currGridTuple[1], 
-                        inPointHierarchy.aabbMin_, inPointHierarchy.aabbMax_, 
-                        currNeighTuple[0], currNeighTuple[1], currKDEWindow, self.convRadius, 
-                        inPointHierarchy.batchSize_, currRelativeRadius)
-            else:
-                neighShape = currNeighTuple[1].shape
-                currPDFs = torch.ones((neighShape[0], 1), dtype=torch.float32).cuda()
-
-            #self.cachePDFs_[keyPDF] = currPDFs
-
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        num_out_features = torch.tensor(currNumOutFeatures, dtype=torch.int64).to(device=device)
-        combin = torch.tensor(currMultiFeatureConv, dtype=torch.bool).to(device=device)
-        batch_size = torch.tensor(inPointHierarchy.batchSize_, dtype=torch.int64).to(device=device)
-        radius = torch.tensor(self.convRadius, dtype=torch.float).to(device=device)
-        scale_inv = torch.tensor(currRelativeRadius, dtype=torch.bool).to(device=device)
-        avg = torch.tensor(currUseAVG, dtype=torch.bool).to(device=device)
-       
+            with torch.no_grad():
+                currPDFs = compute_pdf(currGridTuple[0], currGridTuple[1], aabbMin, aabbMax, 
+                    currNeighTuple[0], currNeighTuple[1], currKDEWindow, self.convRadius, 
+                    batchSize, currRelativeRadius)
+            inPointHierarchy.cachePDFs_[keyPDF] = currPDFs
+
+
         conv1 = spatial_conv(currGridTuple[0], sortFeatures, currGridTuple[1], 
-            currPDFs, currOutPointHierarchy.points_[currOutPointLevel], 
-            currNeighTuple[0], currNeighTuple[1], 
-            inPointHierarchy.aabbMin_, inPointHierarchy.aabbMax_, 
+            currPDFs, outLevel.points, 
+            currNeighTuple[0], currNeighTuple[1], aabbMin, aabbMax, 
             self.weights, self.weights2, self.weights3, self.biases, self.biases2, self.biases3, 
-            num_out_features, combin, batch_size, radius, scale_inv, avg)
+            currNumOutFeatures, currMultiFeatureConv, batchSize, float(self.convRadius), 
+            currRelativeRadius, currUseAVG)
         return conv1
\ No newline at end of file